@@ -0,0 +1,2 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
@@ -0,0 +1,295 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+"""
+Offline end to end benchmark of the chat cog.
+
+Synthetic messages are fed to ChatCommands.on_message, ollama and the discord CDN are replaced by a
+local fake server and redis by an in-process fakeredis (or a local redis with --redis). Nothing
+leaves the machine.
+
+    python -m bench --messages 200 --rate 20 --tokens-per-second 40
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import aiohttp
+import psutil
+
+from bench.fake_discord import FakeAttachment, FakeBot, FakeChannel, FakeGuild, FakeMessage, FakeReference, FakeUser
+from bench.fake_ollama import FakeOllama
+from ollamads.base.backends import OllamaPool
+from ollamads.cogs.chatcog import ChatCommands
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="number of messages to send")
+    parser.add_argument("--rate", type=float, default=20.0, help="messages per second, 0 sends them all at once")
+    parser.add_argument("--guilds", type=int, default=4)
+    parser.add_argument("--channels", type=int, default=2, help="channels per guild")
+    parser.add_argument("--users", type=int, default=50, help="distinct authors")
+    parser.add_argument("--replies", type=float, default=0.2, help="share of messages that reply to the bot instead of mentioning it")
+    parser.add_argument("--images", type=float, default=0.1, help="share of messages with an image attachment")
+    parser.add_argument("--distinct-images", type=int, default=4, help="number of different image URLs")
+    parser.add_argument("--vision-fallback", action="store_true", help="describe images with a separate vision model")
+    parser.add_argument("--ignored", type=float, default=0.0, help="extra messages that don't address the bot, relative to --messages")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="generation speed of the fake ollama")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token (prompt processing)")
+    parser.add_argument("--reply-tokens", type=int, default=100)
+    parser.add_argument("--load-time", type=float, default=0.0, help="seconds to load a model the first time it is used")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="seconds per discord API call")
+    parser.add_argument("--concurrency", type=int, default=2, help="the ollama concurrency setting")
+    parser.add_argument("--edit-interval", type=float, default=1.0, help="the stream edit interval setting")
+    parser.add_argument("--no-stream", action="store_true", help="wait for the whole reply instead of streaming it")
+    parser.add_argument("--image-executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--redis", help="URL of a local redis to use instead of fakeredis, the database is flushed")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the peak of python allocations (slows the run down)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+async def connect_redis(url):
+    if url:
+        import redis.asyncio as redis
+        client = redis.from_url(url, decode_responses=True)
+        await client.flushdb()
+        return client
+
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is not installed, install it with `pip install \"fakeredis[lua]\"` or pass --redis")
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+class LoopMonitor:
+    """Measures how late the event loop wakes up a task that sleeps `interval` seconds at a time."""
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.stalled = 0.0
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.__run__())
+
+    def stop(self):
+        self.task.cancel()
+
+    async def __run__(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.stalled += lag
+
+
+class ChildMemory:
+    """
+    Samples the RSS of the child processes every `interval` seconds. The image workers of the process
+    executor run there, so their memory doesn't show up in the RSS of the bench itself.
+    """
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak_total = 0
+        self.peak_single = 0
+        self.process = psutil.Process()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.__run__())
+
+    def stop(self):
+        self.task.cancel()
+        self.sample()
+
+    def sample(self):
+        sizes = []
+        for child in self.process.children(recursive=True):
+            try:
+                sizes.append(child.memory_info().rss)
+            except psutil.Error:
+                # the child exited in the meantime
+                pass
+        self.peak_total = max(self.peak_total, sum(sizes))
+        self.peak_single = max([self.peak_single] + sizes)
+
+    async def __run__(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    ollama_server = FakeOllama(tokens_per_second=args.tokens_per_second, latency=args.latency, reply_tokens=args.reply_tokens, load_time=args.load_time)
+    await ollama_server.start()
+    redis = await connect_redis(args.redis)
+    session = aiohttp.ClientSession()
+    pool = OllamaPool([ollama_server.url], session)
+
+    bot = FakeBot(asyncio.get_running_loop(), redis, pool, session, {
+        "stream replies": not args.no_stream,
+        "stream edit interval": args.edit_interval,
+        "image executor": args.image_executor,
+        "ollama concurrency": args.concurrency,
+        # background preloads would be counted as ollama requests of the messages
+        "preload models": 0,
+    })
+    cog = ChatCommands(bot)
+    await cog.models.refresh()
+
+    stages = defaultdict(list)
+    cog.timings.subscribe(lambda stage, seconds: stages[stage].append(seconds))
+
+    channels = []
+    for g in range(args.guilds):
+        guild = FakeGuild(100 + g)
+        for c in range(args.channels):
+            channel = FakeChannel(10_000 + g * 100 + c, guild, args.discord_latency)
+            if args.vision_fallback:
+                await cog.settings.set(guild.id, channel.id, model="bench-model", vision=False, vision_fallback="bench-vision")
+            else:
+                await cog.settings.set(guild.id, channel.id, model="bench-vision", vision=True)
+            # an earlier answer of the bot the replies point at
+            channel.earlier = channel.add(FakeMessage(channel, bot.user, "An earlier answer of the bot."))
+            channels.append(channel)
+    users = [FakeUser(1_000 + u) for u in range(args.users)]
+
+    def make_message(i: int, ignored: bool = False) -> FakeMessage:
+        channel = rng.choice(channels)
+        author = rng.choice(users)
+        if ignored:
+            return FakeMessage(channel, author, f"Just chatting {i}")
+
+        attachments = []
+        if rng.random() < args.images:
+            attachments.append(FakeAttachment(f"{ollama_server.url}/image.png?id={i % args.distinct_images}"))
+        if rng.random() < args.replies:
+            return channel.add(FakeMessage(channel, author, f"And what about question {i}?", attachments=attachments, reference=FakeReference(channel.earlier.id)))
+        return channel.add(FakeMessage(channel, author, f"{bot.user.mention} question number {i}, please answer it.", mentions=[bot.user], attachments=attachments))
+
+    messages = [make_message(i) for i in range(args.messages)]
+    messages += [make_message(i, ignored=True) for i in range(int(args.messages * args.ignored))]
+    rng.shuffle(messages)
+    total = len(messages)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    monitor = LoopMonitor()
+    monitor.start()
+    children = ChildMemory()
+    children.start()
+
+    start = time.perf_counter()
+    tasks = []
+    for message in messages:
+        tasks.append(asyncio.ensure_future(cog.on_message(message)))
+        if args.rate > 0:
+            await asyncio.sleep(1 / args.rate)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    monitor.stop()
+    children.stop()
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    replies = [message for channel in channels for message in channel.messages.values() if message.author == bot.user and message is not channel.earlier]
+    failures = [message for message in replies if message.content.startswith(("Error occurred", "Sorry, I couldn't"))]
+    exceptions = [result for result in results if isinstance(result, BaseException)]
+    answered = len(stages["history_write"])
+
+    report = {
+        "messages": total,
+        "answered": answered,
+        "failed": len(failures) + len(exceptions),
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(answered / elapsed, 2),
+        "tokens_per_second": round(answered * args.reply_tokens / elapsed, 1),
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50": round(percentile(values, 50) * 1000, 2),
+                "p95": round(percentile(values, 95) * 1000, 2),
+                "p99": round(percentile(values, 99) * 1000, 2),
+                "max": round(max(values) * 1000, 2),
+            }
+            for stage, values in sorted(stages.items())
+        },
+        "loop_max_lag_ms": round(monitor.max_lag * 1000, 2),
+        "loop_stalled_ms": round(monitor.stalled * 1000, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        # sampled, short spikes between two samples are missed
+        "peak_children_rss_mb": round(children.peak_total / 1024 / 1024, 1),
+        "peak_child_rss_mb": round(children.peak_single / 1024 / 1024, 1),
+        "peak_traced_mb": round(traced_peak / 1024 / 1024, 1) if traced_peak is not None else None,
+        "discord": {
+            "sends": sum(channel.sends for channel in channels),
+            "edits": sum(channel.edits for channel in channels),
+            "fetches": sum(channel.fetches for channel in channels),
+        },
+        "ollama_requests": ollama_server.requests,
+        "errors": sorted({message.content[:200] for message in failures} | {repr(e)[:200] for e in exceptions}),
+    }
+
+    cog.cog_unload()
+    await session.close()
+    await ollama_server.stop()
+    await redis.aclose()
+    return report
+
+
+def print_report(report: dict):
+    print(f"{report['answered']}/{report['messages']} messages answered in {report['seconds']} s, {report['failed']} failed")
+    print(f"throughput: {report['messages_per_second']} messages/s, {report['tokens_per_second']} tokens/s")
+    print()
+    print(f"{'stage':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<16}{values['count']:>8}{values['p50']:>10}{values['p95']:>10}{values['p99']:>10}{values['max']:>10}")
+    print()
+    print(f"event loop: max lag {report['loop_max_lag_ms']} ms, stalled {report['loop_stalled_ms']} ms in total")
+    memory = f"memory: peak RSS {report['peak_rss_mb']} MB"
+    if report["peak_traced_mb"] is not None:
+        memory += f", peak python allocations {report['peak_traced_mb']} MB"
+    if report["peak_children_rss_mb"]:
+        memory += f", child processes (image workers) {report['peak_children_rss_mb']} MB, the largest {report['peak_child_rss_mb']} MB"
+    print(memory)
+    discord = report["discord"]
+    print(f"discord calls: {discord['sends']} sends, {discord['edits']} edits, {discord['fetches']} fetches; ollama requests: {report['ollama_requests']}")
+    for error in report["errors"]:
+        print(f"error: {error}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import contextlib
+import itertools
+from typing import Dict, List, Optional
+
+from ollamads.base.defaults import DEFAULT_SETTINGS
+
+# snowflake-ish ids for the fake messages
+message_ids = itertools.count(1_000_000)
+
+
+class FakeUser:
+    def __init__(self, id: int, bot: bool = False):
+        self.id = id
+        self.bot = bot
+        self.mention = f"<@{id}>"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeGuild:
+    def __init__(self, id: int):
+        self.id = id
+
+
+class FakeAttachment:
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakeReference:
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+        # like an uncached reference, the bot has to fetch the message
+        self.resolved = None
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", author: FakeUser, content: str, mentions: List[FakeUser] = None,
+                 attachments: List[FakeAttachment] = None, reference: FakeReference = None):
+        self.id = next(message_ids)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.mentions = mentions or []
+        self.attachments = attachments or []
+        self.embeds = []
+        self.reference = reference
+
+    async def edit(self, content: str = None, **kwargs):
+        await self.channel.api_call()
+        self.channel.edits += 1
+        self.content = content
+        return self
+
+
+class FakeChannel:
+    """A text channel, every API call takes `latency` seconds like a round trip to discord would."""
+    def __init__(self, id: int, guild: FakeGuild, latency: float = 0.05):
+        self.id = id
+        self.guild = guild
+        self.latency = latency
+        self.messages: Dict[int, FakeMessage] = {}
+        self.sends = 0
+        self.edits = 0
+        self.fetches = 0
+
+    async def api_call(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def add(self, message: FakeMessage) -> FakeMessage:
+        self.messages[message.id] = message
+        return message
+
+    async def send(self, author: FakeUser, content: str) -> FakeMessage:
+        await self.api_call()
+        self.sends += 1
+        return self.add(FakeMessage(self, author, content))
+
+    async def fetch_message(self, id: int) -> FakeMessage:
+        await self.api_call()
+        self.fetches += 1
+        return self.messages[id]
+
+
+class FakeContext:
+    """What `bot.get_context` returns, only the parts the chat cog uses."""
+    def __init__(self, bot: "FakeBot", message: FakeMessage):
+        self.bot = bot
+        self.message = message
+        self.guild = message.guild
+        self.channel = message.channel
+        self.author = message.author
+
+    async def respond(self, content: str = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(self.bot.user, content)
+
+    @contextlib.asynccontextmanager
+    async def typing(self):
+        yield
+
+
+class FakeBot:
+    """
+    Stand-in for the ollamads bot with the same attributes the chat cog reads. `settings` uses the
+    keys of init_settings.json and overrides the defaults of the bot.
+    """
+    def __init__(self, loop, redis, ollama, session, settings: Optional[dict] = None):
+        settings = settings or {}
+        self.loop = loop
+        self.redis = redis
+        self.ollama = ollama
+        self.aiohttp_session = session
+        self.user = FakeUser(1, bot=True)
+        # every setting becomes an attribute of the same name, "stream replies" -> stream_replies
+        for name, value in {**DEFAULT_SETTINGS, **settings}.items():
+            setattr(self, name.replace(" ", "_"), value)
+
+    async def get_context(self, message: FakeMessage) -> FakeContext:
+        return FakeContext(self, message)
+
+    def get_message(self, id: int) -> Optional[FakeMessage]:
+        # the gateway message cache isn't simulated, replied to messages are always fetched
+        return None
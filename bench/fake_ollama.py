@@ -0,0 +1,159 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import io
+import json
+import time
+
+from aiohttp import web
+from PIL import Image
+
+
+class FakeOllama:
+    """
+    A local stand-in for an ollama server. Replies are generated at `tokens_per_second` after a delay
+    of `latency` seconds (prompt processing), `load_time` is added the first time a model is used.
+    It also serves a test image on /image.png to act as the discord CDN.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens_per_second: float = 50.0, latency: float = 0.2,
+                 reply_tokens: int = 100, load_time: float = 0.0, context_length: int = 8192, models=("bench-model", "bench-vision")):
+        self.host = host
+        self.port = port
+        self.tokens_per_second = tokens_per_second
+        self.latency = latency
+        self.reply_tokens = reply_tokens
+        self.load_time = load_time
+        self.context_length = context_length
+        self.models = list(models)
+        self.loaded = set()
+        self.requests = 0
+        self.runner = None
+        self.image = self.__make_image__()
+
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+    @staticmethod
+    def __make_image__(size=(1920, 1080)) -> bytes:
+        image = Image.linear_gradient("L").resize(size).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        return buffer.getvalue()
+
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_get("/api/tags", self.tags)
+        app.router.add_post("/api/show", self.show)
+        app.router.add_get("/api/ps", self.ps)
+        app.router.add_get("/image.png", self.serve_image)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+    async def tags(self, request):
+        return web.json_response({"models": [
+            {
+                "name": model,
+                "model": model,
+                "modified_at": "2025-01-01T00:00:00Z",
+                "size": 4 * 1024 ** 3,
+                "digest": f"{i:064x}",
+                "details": {"format": "gguf", "family": "llama", "parameter_size": "8B", "quantization_level": "Q4_K_M"},
+            }
+            for i, model in enumerate(self.models)
+        ]})
+
+
+    async def show(self, request):
+        body = await request.json()
+        name = body.get("name") or body.get("model")
+        if name not in self.models:
+            return web.json_response({"error": f"model '{name}' not found"}, status=404)
+        capabilities = ["completion"] + (["vision"] if "vision" in name else [])
+        return web.json_response({
+            "capabilities": capabilities,
+            "details": {"family": "llama", "quantization_level": "Q4_K_M"},
+            "model_info": {"general.architecture": "llama", "llama.context_length": self.context_length},
+        })
+
+
+    async def ps(self, request):
+        return web.json_response({"models": [{"name": model, "model": model} for model in self.loaded]})
+
+
+    async def serve_image(self, request):
+        return web.Response(body=self.image, content_type="image/jpeg")
+
+
+    def __final__(self, model: str, prompt_tokens: int, started: float, load: float) -> dict:
+        total = time.perf_counter() - started
+        return {
+            "model": model,
+            "created_at": "2025-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int(total * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.latency * 1e9),
+            "eval_count": self.reply_tokens,
+            "eval_duration": int(self.reply_tokens / self.tokens_per_second * 1e9),
+        }
+
+
+    async def chat(self, request):
+        self.requests += 1
+        started = time.perf_counter()
+        body = await request.json()
+        model = body.get("model")
+        if model not in self.models:
+            return web.json_response({"error": f"model '{model}' not found"}, status=404)
+
+        load = 0.0
+        if model not in self.loaded:
+            load = self.load_time
+            await asyncio.sleep(load)
+            self.loaded.add(model)
+
+        messages = body.get("messages") or []
+        if not messages:
+            # a preload request
+            return web.json_response({"model": model, "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "load"})
+
+        prompt_tokens = sum(len(message.get("content") or "") // 4 + 1 for message in messages)
+        await asyncio.sleep(self.latency)
+
+        if not body.get("stream", True):
+            await asyncio.sleep(self.reply_tokens / self.tokens_per_second)
+            final = self.__final__(model, prompt_tokens, started, load)
+            final["message"]["content"] = " ".join(f"word{i}" for i in range(self.reply_tokens))
+            return web.json_response(final)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        start = time.perf_counter()
+        for i in range(self.reply_tokens):
+            # sleep until the token is due instead of a fixed time per token, so the rate doesn't drift
+            delay = start + (i + 1) / self.tokens_per_second - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            part = {"model": model, "created_at": "2025-01-01T00:00:00Z", "message": {"role": "assistant", "content": f"word{i} "}, "done": False}
+            await response.write(json.dumps(part).encode() + b"\n")
+        await response.write(json.dumps(self.__final__(model, prompt_tokens, started, load)).encode() + b"\n")
+        await response.write_eof()
+        return response
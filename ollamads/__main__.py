@@ -11,8 +11,9 @@ import discord
 import redis.asyncio as redis
 import json
 import asyncio
-from ollama import AsyncClient
 from discord.ext import commands, bridge
+from ollamads.base.backends import OllamaPool
+from ollamads.base.defaults import DEFAULT_SETTINGS
 
 
 __name__ = "ollamads"
@@ -22,6 +23,7 @@ __author__ = "diminDDL and Cuprum"
 extensions = [
     "sudocog",
     "chatcog",
+    "metricscog",
     "utilitiescog",
     "listenercog",
 ]
@@ -37,16 +39,8 @@ intents = discord.Intents.all()
 if not Path(os.path.join(datadir, "init_settings.json")).exists():
     print("No init_settings.json file found. Creating one now.")
 
-    settings_dict_empty = {
-        "ollama server": "http://host.docker.internal:11434",
-        "discord token": "",
-        "default prompt": "You are a helpful dude, perform whatever the user wants.",
-        "default vision prompt": "You will be provided an image from a user, your task is to describe what is in the image. Read all the text in the image, and describe all objects and their locations in your response.",
-        "vetted users": [],
-    }
-
     with open(os.path.join(datadir, "init_settings.json"), "w") as f:
-        json.dump(settings_dict_empty, f, indent=4, ensure_ascii=False)
+        json.dump(DEFAULT_SETTINGS, f, indent=4, ensure_ascii=False)
     os.chown(os.path.join(datadir, "init_settings.json"), 1000, 1000)
 
     exit(1)
@@ -55,12 +49,47 @@ if not Path(os.path.join(datadir, "init_settings.json")).exists():
 with open(os.path.join(datadir, "init_settings.json"), "r") as f:
     try:
         settings_dict = json.load(f)
+
+        def setting(name):
+            return settings_dict.get(name, DEFAULT_SETTINGS[name])
+
         # get the discord token, the tenor api key, and the prefix from the dict
-        ollama_server_url = settings_dict["ollama server"]
+        # a single server or a list of servers to spread the requests over
+        ollama_servers = settings_dict["ollama server"]
+        if isinstance(ollama_servers, str):
+            ollama_servers = [ollama_servers]
         discord_token = settings_dict["discord token"]
         default_prompt = settings_dict["default prompt"]
         default_vision_prompt = settings_dict["default vision prompt"]
         vetted_users = [int(user) for user in settings_dict["vetted users"]]
+        # optional settings, older settings files might not have them
+        stream_replies = bool(setting("stream replies"))
+        stream_edit_interval = float(setting("stream edit interval"))
+        http_timeout = float(setting("http timeout"))
+        http_connections_per_host = int(setting("http connections per host"))
+        image_workers = int(setting("image workers"))
+        image_executor = setting("image executor")
+        max_image_bytes = int(setting("max image bytes"))
+        max_image_pixels = int(setting("max image pixels"))
+        vision_cache_ttl = int(setting("vision cache ttl"))
+        image_cache_size = int(setting("image cache size"))
+        max_context_tokens = int(setting("max context tokens"))
+        reply_token_reserve = int(setting("reply token reserve"))
+        ollama_concurrency = int(setting("ollama concurrency"))
+        guild_weights = {int(guild): float(weight) for guild, weight in setting("guild weights").items()}
+        ollama_health_interval = float(setting("ollama health interval"))
+        keep_alive = setting("keep alive")
+        model_keep_alive = setting("model keep alive")
+        preload_models = int(setting("preload models"))
+        preload_idle_hours = float(setting("preload idle hours"))
+        preload_interval = float(setting("preload interval"))
+        model_refresh_interval = float(setting("model refresh interval"))
+        attachment_threshold = int(setting("attachment threshold"))
+        summary_model = setting("summary model")
+        summary_threshold = int(setting("summary threshold"))
+        summary_keep = int(setting("summary keep"))
+        metrics_port = int(setting("metrics port"))
+        metrics_host = setting("metrics host")
 
     except json.decoder.JSONDecodeError:
         print("init_settings.json is not valid json. Please fix it.")
@@ -72,10 +101,35 @@ class ollamads(bridge.Bot):
     def __init__(self, dirname, help_command=None, description=None, **options):
         super().__init__(help_command=help_command, description=description, **options)
         # ---static values---
-        self.ollama_server = ollama_server_url
+        self.ollama_servers = ollama_servers
+        self.ollama_server = ollama_servers[0]
         self.default_prompt = default_prompt
         self.vetted_users = vetted_users
         self.default_vision_prompt = default_vision_prompt
+        self.stream_replies = stream_replies
+        self.stream_edit_interval = stream_edit_interval
+        self.image_workers = image_workers
+        self.image_executor = image_executor
+        self.max_image_bytes = max_image_bytes
+        self.max_image_pixels = max_image_pixels
+        self.vision_cache_ttl = vision_cache_ttl
+        self.image_cache_size = image_cache_size
+        self.max_context_tokens = max_context_tokens
+        self.reply_token_reserve = reply_token_reserve
+        self.ollama_concurrency = ollama_concurrency
+        self.guild_weights = guild_weights
+        self.keep_alive = keep_alive
+        self.model_keep_alive = model_keep_alive
+        self.preload_models = preload_models
+        self.preload_idle_hours = preload_idle_hours
+        self.preload_interval = preload_interval
+        self.model_refresh_interval = model_refresh_interval
+        self.attachment_threshold = attachment_threshold
+        self.summary_model = summary_model
+        self.summary_threshold = summary_threshold
+        self.summary_keep = summary_keep
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
         # paths
         self.dirname = dirname
         self.datadir = "/app/data/"
@@ -109,7 +163,8 @@ class ollamads(bridge.Bot):
             exit(1)
 
         # ollama connection
-        self.ollama = AsyncClient(host=self.ollama_server)
+        self.ollama = OllamaPool(self.ollama_servers, self.aiohttp_session, ollama_health_interval)
+        self.ollama.start(self.loop)
         # model_list = self.loop.run_until_complete(self.ollama.list())
         # print(f"Connected to ollama server at {self.ollama_server}. Models: {model_list}")
 
@@ -153,7 +208,22 @@ class ollamads(bridge.Bot):
 
 
     async def aiohttp_start(self):
-        self.aiohttp_session = aiohttp.ClientSession()
+        # one pooled session for the whole bot, connections to the discord CDN and ollama are kept alive and reused
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=http_connections_per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        timeout = aiohttp.ClientTimeout(total=http_timeout, connect=10)
+        self.aiohttp_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+    async def close(self):
+        self.ollama.stop()
+        if self.aiohttp_session and not self.aiohttp_session.closed:
+            await self.aiohttp_session.close()
+        await super().close()
 
 
 # create the bot instance
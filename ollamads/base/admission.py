@@ -0,0 +1,131 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import json
+from typing import Dict, Iterable, List, Optional, Set
+
+from ollamads.base.pubsub import InvalidationBus
+
+
+class GuildAdmission:
+    """
+    Bans of a single guild and the whitelists of the channels that were looked at so far.
+    """
+    def __init__(self):
+        self.server_bans: Set[int] = set()
+        self.channel_bans: Dict[int, Set[int]] = {}
+        self.whitelists: Dict[int, Set[int]] = {}
+
+
+    def ban(self, user_id: int, channels: Optional[List[int]], server_ban: bool):
+        self.unban(user_id)
+        if server_ban:
+            self.server_bans.add(user_id)
+        for channel_id in channels or []:
+            self.channel_bans.setdefault(int(channel_id), set()).add(user_id)
+
+
+    def unban(self, user_id: int):
+        self.server_bans.discard(user_id)
+        for users in self.channel_bans.values():
+            users.discard(user_id)
+
+
+class AdmissionIndex:
+    """
+    In-memory index of the ban and whitelist state, answers admission checks without any I/O.
+
+    Guilds are loaded lazily from the guild:{id}:admin hash, channel whitelists from the
+    guild:{id}:channel:{id}:whitelist set. The /admin commands update the index directly and tell
+    other bot processes to drop their copy of the guild.
+    """
+    def __init__(self, bus: InvalidationBus):
+        self.bus = bus
+        self.guilds: Dict[int, GuildAdmission] = {}
+        # bumped on every invalidation so a load that raced an invalidation is thrown away
+        self.generation = 0
+        bus.register("admission", self.__drop__)
+
+
+    def __drop__(self, key: Optional[str]):
+        self.generation += 1
+        if key is None:
+            self.guilds.clear()
+        else:
+            self.guilds.pop(int(key), None)
+
+
+    def has_bans(self, guild_id: int) -> bool:
+        return self.bus.listening and guild_id in self.guilds
+
+
+    def has_whitelist(self, guild_id: int, channel_id: int) -> bool:
+        return self.has_bans(guild_id) and channel_id in self.guilds[guild_id].whitelists
+
+
+    def load_bans(self, guild_id: int, data: Dict[str, str], generation: int):
+        """Index the contents of the guild:{id}:admin hash read at `generation`."""
+        if not self.bus.listening or generation != self.generation:
+            return
+
+        guild = GuildAdmission()
+        for user_id, entry in data.items():
+            try:
+                entry = json.loads(entry)
+            except json.JSONDecodeError:
+                continue
+            guild.ban(int(user_id), entry.get("channels"), entry.get("server_ban", False))
+        self.guilds[guild_id] = guild
+
+
+    def load_whitelist(self, guild_id: int, channel_id: int, members: Iterable[str], generation: int):
+        if not self.has_bans(guild_id) or generation != self.generation:
+            return
+        self.guilds[guild_id].whitelists[channel_id] = {int(user_id) for user_id in members}
+
+
+    def blocked(self, guild_id: int, channel_id: int, user_id: int, whitelist: bool) -> Optional[bool]:
+        """
+        Check if a user may not use the bot in a channel. Returns None if the guild (or the
+        channel whitelist, when enabled) is not loaded yet.
+        """
+        if not self.has_bans(guild_id):
+            return None
+
+        guild = self.guilds[guild_id]
+        if user_id in guild.server_bans or user_id in guild.channel_bans.get(channel_id, ()):
+            return True
+
+        if whitelist:
+            if channel_id not in guild.whitelists:
+                return None
+            return user_id not in guild.whitelists[channel_id]
+
+        return False
+
+
+    async def ban(self, guild_id: int, user_id: int, channels: Optional[List[int]], server_ban: bool = False):
+        """Mirror a ban entry that was just written to redis."""
+        self.generation += 1
+        if guild_id in self.guilds:
+            self.guilds[guild_id].ban(user_id, channels, server_ban)
+        await self.bus.publish("admission", str(guild_id), local=False)
+
+
+    async def unban(self, guild_id: int, user_id: int):
+        self.generation += 1
+        if guild_id in self.guilds:
+            self.guilds[guild_id].unban(user_id)
+        await self.bus.publish("admission", str(guild_id), local=False)
+
+
+    async def whitelist(self, guild_id: int, channel_id: int, user_id: int, allowed: bool):
+        """Mirror a whitelist change that was just written to redis."""
+        self.generation += 1
+        whitelist = self.guilds[guild_id].whitelists.get(channel_id) if guild_id in self.guilds else None
+        if whitelist is not None:
+            if allowed:
+                whitelist.add(user_id)
+            else:
+                whitelist.discard(user_id)
+        await self.bus.publish("admission", str(guild_id), local=False)
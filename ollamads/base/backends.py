@@ -0,0 +1,229 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Set
+
+from ollama import AsyncClient, ListResponse, ResponseError
+
+# a server that doesn't have the model in memory has to load it first, this is about how many
+# requests it may have outstanding before a server that has the model loaded is still preferred
+LOAD_PENALTY = 2
+
+
+class Backend:
+    """One ollama server of the pool."""
+    def __init__(self, host: str):
+        self.host = host.rstrip("/")
+        self.client = AsyncClient(host=self.host)
+        self.outstanding = 0
+        self.healthy = True
+        # models the server reported as loaded on the last health check
+        self.loaded: Set[str] = set()
+        self.last_check = 0.0
+        self.last_error: Optional[str] = None
+
+
+    def __repr__(self):
+        return f"<Backend {self.host} healthy={self.healthy} outstanding={self.outstanding}>"
+
+
+    def score(self, model: Optional[str]) -> int:
+        return self.outstanding + (0 if model is None or model in self.loaded else LOAD_PENALTY)
+
+
+class OllamaPool:
+    """
+    A set of ollama servers that is used like a single `AsyncClient`.
+
+    Every request goes to the healthy server with the fewest outstanding requests, servers that already
+    have the requested model loaded (as reported by /api/ps) get a head start. When a server fails
+    its request is retried on the next one, streamed requests only until the first chunk arrived.
+    The health of every server is checked every `health_interval` seconds.
+
+    Ollama reloads a model whenever it is requested with a different num_ctx, so when `context_length`
+    is set every request and preload is sent with the num_ctx it returns for the model.
+    """
+    def __init__(self, hosts: List[str], session=None, health_interval: float = 15.0, context_length: Callable[[str], int] = None):
+        if not hosts:
+            raise ValueError("At least one ollama server is required.")
+        self.backends = [Backend(host) for host in hosts]
+        self.session = session
+        self.health_interval = health_interval
+        self.context_length = context_length
+        self.task: Optional[asyncio.Task] = None
+
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.task is None and self.session is not None:
+            self.task = loop.create_task(self.__health_loop__())
+
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+    def pick(self, model: Optional[str] = None, exclude: Set[Backend] = frozenset()) -> Optional[Backend]:
+        """The server the next request for `model` should go to, None if every server was excluded."""
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+        # the health checks might be stale, servers marked as down are still better than nothing
+        healthy = [backend for backend in candidates if backend.healthy] or candidates
+        return min(healthy, key=lambda backend: backend.score(model))
+
+
+    def __failed__(self, backend: Backend, error: Exception):
+        backend.healthy = False
+        backend.last_error = str(error) or type(error).__name__
+        print(f"Ollama server {backend.host} failed: {backend.last_error}")
+
+
+    @staticmethod
+    def __retryable__(error: Exception) -> bool:
+        # a missing model might be available on another server, other client errors would fail everywhere
+        return not isinstance(error, ResponseError) or error.status_code >= 500 or error.status_code == 404
+
+
+    def __options__(self, model: str, options: Optional[dict]) -> Optional[dict]:
+        if self.context_length is None or (options and "num_ctx" in options):
+            return options
+        return {**(options or {}), "num_ctx": self.context_length(model)}
+
+
+    async def chat(self, model: str = "", messages=None, stream: bool = False, options: Optional[dict] = None, **kwargs):
+        kwargs["options"] = self.__options__(model, options)
+        if stream:
+            return self.__stream__(model, messages, **kwargs)
+
+        tried = set()
+        while True:
+            backend = self.pick(model, tried)
+            backend.outstanding += 1
+            try:
+                response = await backend.client.chat(model=model, messages=messages, stream=False, **kwargs)
+                backend.loaded.add(model)
+                return response
+            except Exception as e:
+                tried.add(backend)
+                if not self.__retryable__(e) or len(tried) == len(self.backends):
+                    raise
+                if not isinstance(e, ResponseError) or e.status_code != 404:
+                    self.__failed__(backend, e)
+            finally:
+                backend.outstanding -= 1
+
+
+    async def __stream__(self, model: str, messages, **kwargs):
+        tried = set()
+        while True:
+            backend = self.pick(model, tried)
+            backend.outstanding += 1
+            started = False
+            try:
+                async for part in await backend.client.chat(model=model, messages=messages, stream=True, **kwargs):
+                    started = True
+                    yield part
+                backend.loaded.add(model)
+                return
+            except Exception as e:
+                tried.add(backend)
+                # once a part was shown to the user the reply can't be started over somewhere else
+                if started or not self.__retryable__(e) or len(tried) == len(self.backends):
+                    raise
+                if not isinstance(e, ResponseError) or e.status_code != 404:
+                    self.__failed__(backend, e)
+            finally:
+                backend.outstanding -= 1
+
+
+    async def preload(self, model: str, keep_alive=None) -> bool:
+        """
+        Reset the keep alive timer of `model` on the servers that have it loaded. If none has, it is
+        loaded on a server without any model loaded, never in place of another model. Returns whether
+        a request was sent.
+        """
+        healthy = [backend for backend in self.backends if backend.healthy]
+        backends = [backend for backend in healthy if model in backend.loaded]
+        if not backends:
+            idle = [backend for backend in healthy if not backend.loaded]
+            backends = [min(idle, key=lambda backend: backend.outstanding)] if idle else []
+
+        for backend in backends:
+            await self.__preload__(backend, model, keep_alive)
+        return bool(backends)
+
+
+    async def __preload__(self, backend: Backend, model: str, keep_alive=None):
+        backend.outstanding += 1
+        try:
+            # a chat without messages only loads the model
+            await backend.client.chat(model=model, messages=[], keep_alive=keep_alive, options=self.__options__(model, None))
+            backend.loaded.add(model)
+        except Exception as e:
+            if self.__retryable__(e) and not isinstance(e, ResponseError):
+                self.__failed__(backend, e)
+            raise
+        finally:
+            backend.outstanding -= 1
+
+
+    async def list(self) -> ListResponse:
+        """The models available on any healthy server."""
+        backends = [backend for backend in self.backends if backend.healthy] or self.backends
+        responses = await asyncio.gather(*[backend.client.list() for backend in backends], return_exceptions=True)
+
+        models = {}
+        errors = []
+        for backend, response in zip(backends, responses):
+            if isinstance(response, BaseException):
+                self.__failed__(backend, response)
+                errors.append(response)
+                continue
+            for model in response.models:
+                models.setdefault(model.model, model)
+
+        if errors and len(errors) == len(backends):
+            raise errors[0]
+        return ListResponse(models=list(models.values()))
+
+
+    async def model_info(self, model: str) -> Optional[dict]:
+        """The raw /api/show response for `model`, None if no server has it."""
+        tried = set()
+        while (backend := self.pick(model, tried)) is not None:
+            tried.add(backend)
+            try:
+                async with self.session.post(f"{backend.host}/api/show", json={"name": model}) as response:
+                    if response.status == 200:
+                        return await response.json()
+            except Exception as e:
+                self.__failed__(backend, e)
+        return None
+
+
+    async def check(self, backend: Backend):
+        try:
+            async with self.session.get(f"{backend.host}/api/ps") as response:
+                response.raise_for_status()
+                data = await response.json()
+            backend.loaded = {model.get("model") or model.get("name") for model in data.get("models") or []}
+            if not backend.healthy:
+                print(f"Ollama server {backend.host} is back up.")
+            backend.healthy = True
+            backend.last_error = None
+        except Exception as e:
+            if backend.healthy:
+                self.__failed__(backend, e)
+            else:
+                backend.last_error = str(e) or type(e).__name__
+        backend.last_check = time.monotonic()
+
+
+    async def __health_loop__(self):
+        while True:
+            await asyncio.gather(*[self.check(backend) for backend in self.backends])
+            await asyncio.sleep(self.health_interval)
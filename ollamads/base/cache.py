@@ -0,0 +1,66 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Small least recently used cache with an optional time to live for the entries. With `max_size`
+    set, entries are also evicted once the total `sizeof` of the cached values goes over it.
+    """
+    def __init__(self, max_items: int = 1024, ttl: Optional[float] = None, max_size: Optional[int] = None, sizeof: Callable[[Any], int] = len):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.entries.get(key)
+        if entry is None or (self.ttl is not None and entry[0] < time.monotonic()):
+            if entry is not None:
+                self.pop(key)
+            self.misses += 1
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+
+    def put(self, key: Hashable, value: Any):
+        size = self.sizeof(value) if self.max_size is not None else 0
+        if self.max_size is not None and size > self.max_size:
+            return
+
+        self.pop(key)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (expires, value, size)
+        self.size += size
+        while len(self.entries) > self.max_items or (self.max_size is not None and self.size > self.max_size):
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return default
+        self.size -= entry[2]
+        return entry[1]
+
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
@@ -0,0 +1,100 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import json
+from typing import Optional, Set, Tuple
+
+from ollamads.base.scheduler import PRIORITY_BACKGROUND
+from ollamads.base.streaming import strip_reasoning
+
+SUMMARY_PROMPT = ("You summarize conversations between a user and an assistant. Write a short summary of the conversation "
+                  "below that keeps every fact, name, decision and open question the assistant needs to continue it. "
+                  "Reply with the summary only.")
+
+
+class Compactor:
+    """
+    Replaces the oldest turns of long conversations with a summary written by a small model.
+
+    Once a conversation has `threshold` messages, everything but the newest `keep` messages is
+    summarized (together with the previous summary) in the background at the lowest priority, so
+    conversations keep their context instead of losing it to trimming. The summary is only stored if
+    the summarized messages are still the oldest ones by then.
+    """
+    def __init__(self, history, ollama, scheduler, model: str, threshold: int = 16, keep: int = 6, keep_alive=None, telemetry=None):
+        self.history = history
+        self.ollama = ollama
+        self.scheduler = scheduler
+        self.model = model
+        self.threshold = threshold
+        # rounded down to whole turns so the kept messages start with the user
+        self.keep = max(2, keep // 2 * 2)
+        self.keep_alive = keep_alive
+        self.telemetry = telemetry
+        self.pending: Set[Tuple[int, int, int]] = set()
+        self.tasks: Set[asyncio.Task] = set()
+
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.model) and self.threshold > self.keep
+
+
+    def maybe_compact(self, guild_id: int, channel_id: int, user_id: int, length: int) -> Optional[asyncio.Task]:
+        """Start compacting the conversation in the background if it has grown past the threshold."""
+        key = (guild_id, channel_id, user_id)
+        if not self.enabled or length < self.threshold or key in self.pending:
+            return None
+
+        self.pending.add(key)
+        task = asyncio.get_running_loop().create_task(self.compact(guild_id, channel_id, user_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+    def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+
+    async def compact(self, guild_id: int, channel_id: int, user_id: int) -> bool:
+        try:
+            async with self.scheduler.slot(guild_id, user_id, PRIORITY_BACKGROUND):
+                conversation = await self.history.load(guild_id, channel_id, user_id)
+                if conversation.legacy or len(conversation.messages) < self.threshold:
+                    return False
+
+                count = len(conversation.messages) - self.keep
+                oldest = await self.history.oldest(guild_id, channel_id, user_id, count)
+                summary = await self.summarize(conversation.summary, [json.loads(message) for message in oldest])
+                if not summary:
+                    return False
+
+                return await self.history.compact(guild_id, channel_id, user_id, oldest, summary)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Failed to summarize the conversation of {user_id} in {channel_id}: {e}")
+            return False
+        finally:
+            self.pending.discard((guild_id, channel_id, user_id))
+
+
+    async def summarize(self, summary: Optional[str], messages) -> str:
+        lines = []
+        if summary:
+            lines.append(f"Summary of the conversation so far: {summary}")
+        for message in messages:
+            lines.append(f"{message.get('role')}: {message.get('content')}")
+
+        response = await self.ollama.chat(
+            model=self.model,
+            messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": "\n\n".join(lines)}],
+            keep_alive=self.keep_alive,
+        )
+        if self.telemetry is not None:
+            self.telemetry.record(self.model, response)
+        # a reasoning block would be sent along with every following turn
+        return strip_reasoning(response.message.content or "").strip()
@@ -0,0 +1,38 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+# the contents of a new init_settings.json, and the values of the optional settings older files don't have
+DEFAULT_SETTINGS = {
+    "ollama server": "http://host.docker.internal:11434",
+    "discord token": "",
+    "default prompt": "You are a helpful dude, perform whatever the user wants.",
+    "default vision prompt": "You will be provided an image from a user, your task is to describe what is in the image. Read all the text in the image, and describe all objects and their locations in your response.",
+    "vetted users": [],
+    "stream replies": True,
+    "stream edit interval": 1.0,
+    "http timeout": 30,
+    "http connections per host": 8,
+    "image workers": 1,
+    "image executor": "process",
+    "max image bytes": 20_000_000,
+    "max image pixels": 16_000_000,
+    "vision cache ttl": 86400,
+    "image cache size": 64_000_000,
+    "max context tokens": 8192,
+    "reply token reserve": 1024,
+    "ollama concurrency": 2,
+    "guild weights": {},
+    "ollama health interval": 15,
+    "keep alive": "30m",
+    "model keep alive": {},
+    "preload models": 1,
+    "preload idle hours": 6,
+    "preload interval": 300,
+    "model refresh interval": 300,
+    "attachment threshold": 4000,
+    "summary model": "",
+    "summary threshold": 16,
+    "summary keep": 6,
+    "metrics port": 0,
+    "metrics host": "0.0.0.0",
+}
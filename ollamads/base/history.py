@@ -0,0 +1,245 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import json
+from typing import Dict, List, Optional
+
+# appends the messages of a turn, trims the list and records its new length in the channel index
+APPEND_SCRIPT = """
+if ARGV[4] == "1" then
+    redis.call("HDEL", KEYS[1], "chat_history")
+    redis.call("HSET", KEYS[1], "system", ARGV[3])
+    redis.call("DEL", KEYS[2])
+else
+    redis.call("HSETNX", KEYS[1], "system", ARGV[3])
+end
+if tonumber(ARGV[6]) > 0 then
+    redis.call("LTRIM", KEYS[2], tonumber(ARGV[6]), -1)
+end
+redis.call("RPUSH", KEYS[2], unpack(ARGV, 7))
+local length = redis.call("LLEN", KEYS[2])
+if length > tonumber(ARGV[1]) then
+    redis.call("LTRIM", KEYS[2], -tonumber(ARGV[5]), -1)
+    length = redis.call("LLEN", KEYS[2])
+end
+redis.call("HSET", KEYS[3], ARGV[2], length)
+return length
+"""
+
+# replaces the oldest messages with a summary, unless they changed since they were read
+COMPACT_SCRIPT = """
+local count = #ARGV - 2
+local head = redis.call("LRANGE", KEYS[2], 0, count - 1)
+if #head ~= count then
+    return 0
+end
+for i = 1, count do
+    if head[i] ~= ARGV[i + 2] then
+        return 0
+    end
+end
+redis.call("LTRIM", KEYS[2], count, -1)
+redis.call("HSET", KEYS[1], "summary", ARGV[2])
+redis.call("HSET", KEYS[3], ARGV[1], redis.call("LLEN", KEYS[2]))
+return 1
+"""
+
+
+class Conversation:
+    """
+    The chat history of one user in one channel.
+    """
+    def __init__(self, system: Optional[str] = None, messages: List[dict] = None, legacy: bool = False, summary: Optional[str] = None):
+        self.system = system
+        self.messages = messages or []
+        # stored in the old single blob format, gets converted on the next append
+        self.legacy = legacy
+        # summary of the messages that were compacted away
+        self.summary = summary
+
+
+    def __len__(self):
+        return len(self.messages)
+
+
+    def to_chat(self, prompt: str) -> List[dict]:
+        """The messages to send to the model, `prompt` is used if the conversation has no system prompt yet."""
+        chat = [{"role": "system", "content": self.system or prompt}]
+        if self.summary:
+            chat.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        return chat + list(self.messages)
+
+
+class HistoryStore:
+    """
+    Chat histories are kept in two keys per user per channel:
+    - guild:{g}:channel:{c}:user:{u}:history, a hash whose "system" field holds the system prompt the conversation started with
+      and whose "summary" field holds the summary of the compacted messages, if any
+    - guild:{g}:channel:{c}:user:{u}:history:messages, a list of JSON encoded messages
+
+    Every channel also has an index, guild:{g}:channel:{c}:conversations, a hash of user id -> number
+    of messages, so a channel's conversations can be listed and cleared without scanning the keyspace.
+
+    New messages are appended, the list is trimmed and the index is updated in one script, so a turn
+    only writes its own messages and concurrent turns can't overwrite each other. Conversations stored by
+    older versions as a single JSON blob in the "chat_history" hash field are converted on their next append.
+
+    Trimming happens in blocks: once a conversation grows past `max_history` messages it is cut down to
+    the newest `trim_to`. In between, turns only append, so the start of the prompt stays the same from
+    one turn to the next and ollama can reuse its prompt cache.
+    """
+    # set once the conversations stored before the index existed were added to it
+    indexed_key = "ollamads:history:indexed"
+
+    def __init__(self, redis, max_history: int = 20):
+        self.redis = redis
+        self.max_history = max_history
+        # an even number, so the conversation still starts with a user message
+        self.trim_to = max(2, max_history // 2 // 2 * 2)
+        self.append_script = redis.register_script(APPEND_SCRIPT)
+        self.compact_script = redis.register_script(COMPACT_SCRIPT)
+
+
+    @staticmethod
+    def key(guild_id: int, channel_id: int, user_id: int) -> str:
+        return f"guild:{guild_id}:channel:{channel_id}:user:{user_id}:history"
+
+
+    @staticmethod
+    def index_key(guild_id: int, channel_id: int) -> str:
+        return f"guild:{guild_id}:channel:{channel_id}:conversations"
+
+
+    def queue_load(self, pipe, guild_id: int, channel_id: int, user_id: int):
+        """Queue the reads for a conversation on a pipeline, `parse` turns the two results into a Conversation."""
+        key = self.key(guild_id, channel_id, user_id)
+        pipe.hmget(key, "system", "chat_history", "summary")
+        pipe.lrange(f"{key}:messages", 0, -1)
+
+
+    @staticmethod
+    def parse(results: list) -> Conversation:
+        """Build a Conversation out of the (consumed) first two results of a pipeline prepared with `queue_load`."""
+        (system, legacy, summary), messages = results.pop(0), results.pop(0)
+
+        if legacy and not messages:
+            legacy = json.loads(legacy)
+            if legacy and legacy[0].get("role") == "system":
+                return Conversation(legacy[0]["content"], legacy[1:], legacy=True)
+            return Conversation(None, legacy, legacy=True)
+
+        return Conversation(system, [json.loads(message) for message in messages], summary=summary)
+
+
+    async def load(self, guild_id: int, channel_id: int, user_id: int) -> Conversation:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self.queue_load(pipe, guild_id, channel_id, user_id)
+            return self.parse(await pipe.execute())
+
+
+    async def append(self, guild_id: int, channel_id: int, user_id: int, conversation: Conversation, system: str, messages: List[dict], drop: int = 0) -> int:
+        """
+        Append the messages of a finished turn to a conversation, `drop` of the oldest messages are
+        removed first (the ones that no longer fit in the context window). Returns the new length.
+        """
+        key = self.key(guild_id, channel_id, user_id)
+        if conversation.legacy:
+            messages = conversation.messages[drop:] + messages
+            system = conversation.system or system
+            drop = 0
+
+        length = await self.append_script(
+            keys=[key, f"{key}:messages", self.index_key(guild_id, channel_id)],
+            args=[self.max_history, user_id, system, "1" if conversation.legacy else "0", self.trim_to, drop,
+                  *[json.dumps(message) for message in messages]],
+        )
+        conversation.legacy = False
+        return length
+
+
+    async def oldest(self, guild_id: int, channel_id: int, user_id: int, count: int) -> List[str]:
+        """The oldest `count` messages as stored (JSON encoded), for `compact`."""
+        key = self.key(guild_id, channel_id, user_id)
+        return await self.redis.lrange(f"{key}:messages", 0, count - 1)
+
+
+    async def compact(self, guild_id: int, channel_id: int, user_id: int, oldest: List[str], summary: str) -> bool:
+        """
+        Replace the `oldest` messages (as returned by `oldest`) with `summary`. Returns False and changes
+        nothing if the conversation was trimmed or cleared in the meantime.
+        """
+        key = self.key(guild_id, channel_id, user_id)
+        return bool(await self.compact_script(
+            keys=[key, f"{key}:messages", self.index_key(guild_id, channel_id)],
+            args=[user_id, summary, *oldest],
+        ))
+
+
+    async def clear(self, guild_id: int, channel_id: int, user_id: int):
+        key = self.key(guild_id, channel_id, user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key, f"{key}:messages")
+            pipe.hdel(self.index_key(guild_id, channel_id), user_id)
+            await pipe.execute()
+
+
+    async def lengths(self, guild_id: int, channel_id: int) -> Dict[int, int]:
+        """The number of messages of every conversation in a channel."""
+        index = await self.redis.hgetall(self.index_key(guild_id, channel_id))
+        return {int(user_id): int(length) for user_id, length in index.items()}
+
+
+    async def clear_channel(self, guild_id: int, channel_id: int) -> int:
+        """Delete every conversation in a channel, returns how many there were."""
+        index_key = self.index_key(guild_id, channel_id)
+        user_ids = await self.redis.hkeys(index_key)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for user_id in user_ids:
+                key = self.key(guild_id, channel_id, user_id)
+                pipe.delete(key, f"{key}:messages")
+            # only the users that were just cleared, conversations started in the meantime stay indexed
+            if user_ids:
+                pipe.hdel(index_key, *user_ids)
+            await pipe.execute()
+
+        return len(user_ids)
+
+
+    async def build_index(self, batch: int = 500):
+        """
+        Add the conversations stored before the channel index existed to it. This scans the keyspace,
+        so it only runs until it completed once per redis database.
+        """
+        if await self.redis.exists(self.indexed_key):
+            return
+
+        keys = []
+        async for key in self.redis.scan_iter("guild:*:channel:*:user:*:history", count=batch):
+            keys.append(key)
+            if len(keys) >= batch:
+                await self.__index_keys__(keys)
+                keys = []
+        if keys:
+            await self.__index_keys__(keys)
+        await self.redis.set(self.indexed_key, 1)
+
+
+    async def __index_keys__(self, keys: List[str]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hget(key, "chat_history")
+                pipe.llen(f"{key}:messages")
+            results = await pipe.execute()
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for i, key in enumerate(keys):
+                legacy, length = results[2 * i], results[2 * i + 1]
+                if not length and legacy:
+                    # the old format keeps the system prompt in the blob
+                    messages = json.loads(legacy)
+                    length = len(messages) - (1 if messages and messages[0].get("role") == "system" else 0)
+                if length:
+                    _, guild_id, _, channel_id, _, user_id, _ = key.split(":")
+                    pipe.hsetnx(self.index_key(guild_id, channel_id), user_id, length)
+            await pipe.execute()
@@ -0,0 +1,50 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+# This module runs inside the image worker pool, keep its imports light.
+
+import io
+import base64
+from typing import Optional
+
+from PIL import Image
+
+
+def process_image(data: bytes, size: int = 672, max_pixels: int = 16_000_000, max_frames: int = 50) -> Optional[str]:
+    """
+    Decode an image, shrink it to fit in a `size` x `size` box and return it as a base64 encoded PNG.
+    Animated images are reduced to their middle frame (but never further in than `max_frames`).
+    Returns None if the image can't be decoded or has more than `max_pixels` pixels.
+    """
+    try:
+        # only the header is read here, the pixel data is decoded later
+        image = Image.open(io.BytesIO(data))
+
+        # let the JPEG decoder scale down while decoding instead of decoding at full resolution
+        if image.format == "JPEG":
+            image.draft("RGB", (size, size))
+
+        width, height = image.size
+        if width * height > max_pixels:
+            return None
+
+        if image.format == "GIF":
+            if hasattr(image, 'is_animated') and image.is_animated:
+                frame_index = 0
+                if hasattr(image, 'n_frames') and image.n_frames > 1:
+                    frame_index = min(image.n_frames // 2, max_frames)
+                image.seek(frame_index)
+            image = image.convert("RGBA")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+            # CMYK jpegs and friends can't be saved as PNG
+            image = image.convert("RGBA")
+
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+        # Convert image to a byte stream
+        with io.BytesIO() as img_byte_arr:
+            image.save(img_byte_arr, format="PNG")
+            return base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+
+    except Exception:
+        return None
@@ -0,0 +1,165 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ollamads.base.tokens import context_length
+
+
+def vision_capable(info: Optional[dict]) -> bool:
+    """
+    Whether a model can look at images, from its /api/show response. Newer ollama versions list the
+    capabilities of a model, for older ones any mention of vision in the model info has to do.
+    """
+    if not info:
+        return False
+    if "capabilities" in info:
+        return "vision" in (info.get("capabilities") or [])
+    return any("vision" in str(key) or (isinstance(value, dict) and any("vision" in str(k) for k in value.keys())) for key, value in info.items())
+
+
+class ModelInfo:
+    """A model of the ollama catalogue and what it can do."""
+    def __init__(self, name: str, digest: str = None, size: int = 0, modified_at: datetime = None, family: str = None,
+                 parameter_size: str = None, quantization_level: str = None):
+        self.name = name
+        self.digest = digest
+        self.size = size
+        self.modified_at = modified_at
+        self.family = family
+        self.parameter_size = parameter_size
+        self.quantization_level = quantization_level
+        # filled from /api/show, None until that succeeded (context_length may stay None after it)
+        self.vision: Optional[bool] = None
+        self.context_length: Optional[int] = None
+        self.described = False
+
+
+    @classmethod
+    def from_list(cls, model) -> "ModelInfo":
+        """Build from an entry of the ollama list response."""
+        details = model.details
+        return cls(
+            model.model,
+            model.digest,
+            model.size or 0,
+            model.modified_at,
+            details.family if details else None,
+            details.parameter_size if details else None,
+            details.quantization_level if details else None,
+        )
+
+
+    @property
+    def size_mb(self) -> float:
+        return round(self.size / 1024 / 1024, 2)
+
+
+    def update(self, info: Optional[dict]):
+        if not info:
+            return
+        self.described = True
+        self.vision = vision_capable(info)
+        self.context_length = context_length(info)
+        details = info.get("details") or {}
+        self.family = details.get("family") or self.family
+        self.quantization_level = details.get("quantization_level") or self.quantization_level
+
+
+class ModelRegistry:
+    """
+    The models available on ollama, refreshed in the background every `interval` seconds.
+
+    Models are compared by digest, only new and changed models are looked up with `show` (which
+    returns the /api/show response for a model name). Lookups never touch the network.
+    """
+    def __init__(self, ollama, show: Callable[[str], Awaitable[Optional[dict]]], interval: float = 300.0):
+        self.ollama = ollama
+        self.show = show
+        self.interval = interval
+        self.models: Dict[str, ModelInfo] = {}
+        self.last_updated: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+
+
+    def __len__(self):
+        return len(self.models)
+
+
+    def __iter__(self):
+        return iter(self.models.values())
+
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.task is None:
+            self.task = loop.create_task(self.__run__())
+
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+    def get(self, name: Optional[str]) -> Optional[ModelInfo]:
+        return self.models.get(name) if name else None
+
+
+    def find(self, name: str) -> Optional[ModelInfo]:
+        """Case insensitive lookup, for model names typed by users."""
+        name = name.lower().strip()
+        return next((model for model in self.models.values() if model.name.lower() == name), None)
+
+
+    async def describe(self, model: ModelInfo):
+        """Look up what `model` can do, failures leave it undescribed."""
+        try:
+            model.update(await self.show(model.name))
+        except Exception as e:
+            print(f"Failed to get the details of {model.name}: {e}")
+
+
+    async def refresh(self) -> Tuple[List[str], List[str], List[str]]:
+        """Sync with ollama, returns the names of the added, removed and changed models."""
+        async with self.lock:
+            response = await self.ollama.list()
+            listed = {model.model: ModelInfo.from_list(model) for model in response.models}
+
+            added = [name for name in listed if name not in self.models]
+            removed = [name for name in self.models if name not in listed]
+            changed = [name for name in listed if name in self.models and self.models[name].digest != listed[name].digest]
+
+            models = {}
+            for name, model in listed.items():
+                known = self.models.get(name)
+                # unchanged models keep what was already looked up about them
+                if known is not None and name not in changed and known.described:
+                    model.described = True
+                    model.vision = known.vision
+                    model.context_length = known.context_length
+                    model.family = known.family or model.family
+                    model.quantization_level = known.quantization_level or model.quantization_level
+                models[name] = model
+
+            await asyncio.gather(*[self.describe(model) for model in models.values() if not model.described])
+
+            self.models = models
+            self.last_updated = datetime.now()
+
+            if added or removed or changed:
+                print(f"Models updated: {len(added)} added, {len(removed)} removed, {len(changed)} changed.")
+            return added, removed, changed
+
+
+    async def __run__(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Failed to load models: {e}")
+            await asyncio.sleep(self.interval)
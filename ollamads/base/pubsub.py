@@ -0,0 +1,88 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import uuid
+from typing import Callable, Dict, Optional
+
+
+class InvalidationBus:
+    """
+    Broadcasts cache invalidations to every bot process over a redis pub/sub channel.
+
+    Messages look like "<sender>:<kind>:<key>", the handler registered for <kind> is called with <key>
+    in every process except the sender.
+    Whenever the subscription is (re)established handlers are called with None, meaning they
+    have to drop everything since invalidations might have been missed in the meantime.
+    """
+    def __init__(self, redis, channel: str = "ollamads:invalidate"):
+        self.redis = redis
+        self.channel = channel
+        self.id = uuid.uuid4().hex
+        self.handlers: Dict[str, Callable[[Optional[str]], None]] = {}
+        self.listening = False
+        self.task = None
+
+
+    def register(self, kind: str, handler: Callable[[Optional[str]], None]):
+        self.handlers[kind] = handler
+
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.task is None:
+            self.task = loop.create_task(self.__listen__())
+
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.listening = False
+
+
+    async def publish(self, kind: str, key: str, local: bool = True):
+        """
+        Invalidate `key` everywhere. With local=False this process is skipped, for caches that
+        already applied the change themselves.
+        """
+        if local:
+            self.__dispatch__(kind, key)
+        await self.redis.publish(self.channel, f"{self.id}:{kind}:{key}")
+
+
+    def __dispatch__(self, kind: str, key: Optional[str]):
+        handler = self.handlers.get(kind)
+        if handler:
+            handler(key)
+
+
+    def __reset__(self):
+        for handler in self.handlers.values():
+            handler(None)
+
+
+    async def __listen__(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self.__reset__()
+                self.listening = True
+
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    sender, kind, key = message["data"].split(":", 2)
+                    if sender != self.id:
+                        self.__dispatch__(kind, key)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Invalidation listener failed: {e}")
+                await asyncio.sleep(5)
+            finally:
+                # caches can't be trusted while we might be missing invalidations
+                self.listening = False
+                self.__reset__()
+                await pubsub.aclose()
@@ -0,0 +1,119 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Union
+
+from ollamads.base.scheduler import PRIORITY_BACKGROUND
+
+
+class ResidencyManager:
+    """
+    Keeps the models of active channels loaded in ollama so the first message after a quiet period
+    doesn't have to wait for the model to load.
+
+    The time every model was last used is kept in a sorted set shared by all bot processes. Every
+    `interval` seconds the keep alive timer of the `max_models` most recently used models is reset,
+    models that aren't loaded are only loaded onto idle servers so they never evict a model in use.
+    Models that weren't used for `idle_hours` are forgotten. On the first run the set is filled with
+    the models configured in the channel settings.
+    """
+    key = "ollamads:models:last_used"
+
+    def __init__(self, redis, ollama, scheduler, keep_alive: Union[str, int] = "30m", model_keep_alive: Dict[str, Union[str, int]] = None,
+                 max_models: int = 1, idle_hours: float = 6.0, interval: float = 300.0):
+        self.redis = redis
+        self.ollama = ollama
+        self.scheduler = scheduler
+        self.default_keep_alive = keep_alive
+        self.model_keep_alive = model_keep_alive or {}
+        self.max_models = max_models
+        self.idle_hours = idle_hours
+        self.interval = interval
+        # uses since the last sync, written to redis in one go
+        self.pending: Dict[str, float] = {}
+        self.preloaded: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.task is None and self.max_models > 0:
+            self.task = loop.create_task(self.__run__())
+
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+    def keep_alive(self, model: str) -> Union[str, int]:
+        """The keep_alive to send along with requests for `model`."""
+        return self.model_keep_alive.get(model, self.default_keep_alive)
+
+
+    def touch(self, model: Optional[str]):
+        if model:
+            self.pending[model] = time.time()
+
+
+    async def __bootstrap__(self):
+        if await self.redis.zcard(self.key):
+            return
+
+        models = set()
+        keys = [key async for key in self.redis.scan_iter("guild:*:channel:*:settings")]
+        if keys:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hmget(key, "model", "vision_fallback")
+                for configured in await pipe.execute():
+                    models.update(model for model in configured if model)
+
+        if models:
+            # configured but never seen in use, they rank as used right now
+            now = time.time()
+            await self.redis.zadd(self.key, {model: now for model in models}, nx=True)
+
+
+    async def sync(self) -> List[str]:
+        """Write the pending uses to redis and get the models that should be kept loaded, most recently used first."""
+        pending, self.pending = self.pending, {}
+        cutoff = time.time() - self.idle_hours * 3600
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if pending:
+                pipe.zadd(self.key, pending, gt=True)
+            pipe.zremrangebyscore(self.key, "-inf", cutoff)
+            pipe.zrevrange(self.key, 0, self.max_models - 1)
+            results = await pipe.execute()
+
+        return results[-1]
+
+
+    async def preload(self, model: str) -> bool:
+        async with self.scheduler.slot(0, 0, PRIORITY_BACKGROUND):
+            return await self.ollama.preload(model, self.keep_alive(model))
+
+
+    async def __run__(self):
+        try:
+            await self.__bootstrap__()
+        except Exception as e:
+            print(f"Failed to find the configured models: {e}")
+
+        while True:
+            try:
+                self.preloaded = await self.sync()
+                # the most recently used model goes last, so it is the one left loaded if they don't all fit
+                for model in reversed(self.preloaded):
+                    try:
+                        await self.preload(model)
+                    except Exception as e:
+                        print(f"Failed to preload {model}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Model residency sync failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,173 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+
+from ollamads.base.timing import StageTimings
+
+# lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class FairShare:
+    """
+    Stride scheduling: every key has a pass value that grows by 1/weight each time it is served,
+    the active key with the lowest pass goes next. Keys that become active start at the current
+    virtual time so they can't bank credit while idle.
+    """
+    def __init__(self):
+        self.passes: Dict[Hashable, float] = {}
+        self.vtime = 0.0
+
+
+    def activate(self, key: Hashable):
+        self.passes[key] = max(self.passes.get(key, 0.0), self.vtime)
+
+
+    def pick(self, active) -> Hashable:
+        return min(active, key=lambda key: self.passes[key])
+
+
+    def charge(self, key: Hashable, weight: float = 1.0):
+        self.vtime = self.passes[key]
+        self.passes[key] += 1.0 / weight
+
+
+    def deactivate(self, key: Hashable):
+        # nothing to remember once the key is not ahead of the virtual time anymore
+        if self.passes.get(key, 0.0) <= self.vtime:
+            self.passes.pop(key, None)
+
+
+class Waiter:
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class PriorityLevel:
+    """Waiters of one priority, queued per guild and per user."""
+    def __init__(self):
+        self.guilds: Dict[int, Dict[int, Deque[Waiter]]] = {}
+        self.guild_share = FairShare()
+        self.user_shares: Dict[int, FairShare] = {}
+
+
+class InferenceScheduler:
+    """
+    Admission control for ollama requests. At most `concurrency` requests run at the same time,
+    free slots go to the most urgent priority first, then fairly across guilds (weighted by
+    `guild_weights`) and within a guild fairly across users.
+
+    Usage:
+        async with scheduler.slot(guild_id, user_id):
+            await ollama.chat(...)
+    """
+    def __init__(self, concurrency: int = 2, guild_weights: Dict[int, float] = None, timings: StageTimings = None):
+        self.concurrency = concurrency
+        self.timings = timings or StageTimings()
+        self.guild_weights = guild_weights or {}
+        self.running = 0
+        self.queued = 0
+        self.levels: Dict[int, PriorityLevel] = {}
+        # recent queue wait times in seconds
+        self.wait_times: Deque[float] = deque(maxlen=1000)
+
+
+    @contextlib.asynccontextmanager
+    async def slot(self, guild_id: int, user_id: int, priority: int = PRIORITY_INTERACTIVE):
+        waiter = Waiter(asyncio.get_running_loop().create_future())
+        self.__enqueue__(waiter, guild_id, user_id, priority)
+        self.__dispatch__()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # the slot might have been handed to us right before the cancellation
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.__release__()
+            raise
+
+        wait = time.monotonic() - waiter.enqueued
+        if priority == PRIORITY_INTERACTIVE:
+            self.wait_times.append(wait)
+            self.timings.observe("queue_wait", wait)
+        else:
+            # preloads and summaries are expected to wait, they would hide what users wait for
+            self.timings.observe("background_queue_wait", wait)
+        try:
+            yield
+        finally:
+            self.__release__()
+
+
+    def __enqueue__(self, waiter: Waiter, guild_id: int, user_id: int, priority: int):
+        level = self.levels.setdefault(priority, PriorityLevel())
+        users = level.guilds.get(guild_id)
+        if users is None:
+            users = level.guilds[guild_id] = {}
+            level.guild_share.activate(guild_id)
+
+        queue = users.get(user_id)
+        if queue is None:
+            queue = users[user_id] = deque()
+            level.user_shares.setdefault(guild_id, FairShare()).activate(user_id)
+
+        queue.append(waiter)
+        self.queued += 1
+
+
+    def __pop__(self) -> Optional[Waiter]:
+        for priority in sorted(self.levels):
+            level = self.levels[priority]
+            if not level.guilds:
+                continue
+
+            guild_id = level.guild_share.pick(level.guilds)
+            level.guild_share.charge(guild_id, self.guild_weights.get(guild_id, 1.0))
+            users = level.guilds[guild_id]
+            user_share = level.user_shares[guild_id]
+            user_id = user_share.pick(users)
+            user_share.charge(user_id)
+
+            queue = users[user_id]
+            waiter = queue.popleft()
+            self.queued -= 1
+
+            if not queue:
+                del users[user_id]
+                user_share.deactivate(user_id)
+            if not users:
+                del level.guilds[guild_id]
+                level.guild_share.deactivate(guild_id)
+                del level.user_shares[guild_id]
+
+            return waiter
+
+        return None
+
+
+    def __dispatch__(self):
+        while self.running < self.concurrency:
+            waiter = self.__pop__()
+            if waiter is None:
+                return
+            # the waiting task was cancelled
+            if waiter.future.done():
+                continue
+            self.running += 1
+            waiter.future.set_result(None)
+
+
+    def __release__(self):
+        self.running -= 1
+        self.__dispatch__()
+
+
+    def average_wait(self) -> float:
+        return sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0.0
@@ -0,0 +1,108 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+from typing import Dict, Optional, Tuple
+
+from ollamads.base.pubsub import InvalidationBus
+
+
+def to_bool(value: Optional[str]) -> Optional[bool]:
+    """Settings are stored as "True"/"False" strings, None means the setting was never set."""
+    if value is None:
+        return None
+    return value == "True"
+
+
+class ChannelSettings:
+    """
+    Typed view of the guild:{guild}:channel:{channel}:settings hash.
+    """
+    fields = ("model", "vision", "vision_fallback", "vision_prompt", "prompt", "bot2bot", "whitelist")
+
+    def __init__(self, model: str = None, vision: bool = None, vision_fallback: str = None, vision_prompt: str = None,
+                 prompt: str = None, bot2bot: bool = None, whitelist: bool = None):
+        self.model = model
+        self.vision = vision
+        self.vision_fallback = vision_fallback
+        self.vision_prompt = vision_prompt
+        self.prompt = prompt
+        self.bot2bot = bot2bot
+        self.whitelist = whitelist
+
+    @classmethod
+    def from_hash(cls, data: Dict[str, str]):
+        return cls(
+            model=data.get("model") or None,
+            vision=to_bool(data.get("vision")),
+            vision_fallback=data.get("vision_fallback") or None,
+            vision_prompt=data.get("vision_prompt") or None,
+            prompt=data.get("prompt") or None,
+            bot2bot=to_bool(data.get("bot2bot")),
+            whitelist=to_bool(data.get("whitelist")),
+        )
+
+
+class SettingsCache:
+    """
+    In-process cache of the channel settings. Every write goes through this class and is
+    broadcast over the invalidation bus so other bot processes drop their copy as well.
+    """
+    def __init__(self, redis, bus: InvalidationBus):
+        self.redis = redis
+        self.bus = bus
+        self.cache: Dict[Tuple[int, int], ChannelSettings] = {}
+        # bumped on every invalidation so a load that raced an invalidation is not cached
+        self.generation = 0
+        bus.register("settings", self.__drop__)
+
+
+    @staticmethod
+    def key(guild_id: int, channel_id: int) -> str:
+        return f"guild:{guild_id}:channel:{channel_id}:settings"
+
+
+    def __drop__(self, key: Optional[str]):
+        self.generation += 1
+        if key is None:
+            self.cache.clear()
+            return
+
+        guild_id, _, channel_id = key.partition(":")
+        self.cache.pop((int(guild_id), int(channel_id)), None)
+
+
+    def peek(self, guild_id: int, channel_id: int) -> Optional[ChannelSettings]:
+        """Return the cached settings without doing any I/O, None if they are not cached."""
+        if not self.bus.listening:
+            return None
+        return self.cache.get((guild_id, channel_id))
+
+
+    def store(self, guild_id: int, channel_id: int, data: Dict[str, str], generation: int) -> ChannelSettings:
+        """Cache a settings hash that was read from redis when the generation was `generation`."""
+        settings = ChannelSettings.from_hash(data)
+        if self.bus.listening and generation == self.generation:
+            self.cache[(guild_id, channel_id)] = settings
+        return settings
+
+
+    async def get(self, guild_id: int, channel_id: int) -> ChannelSettings:
+        settings = self.peek(guild_id, channel_id)
+        if settings is not None:
+            return settings
+
+        generation = self.generation
+        data = await self.redis.hgetall(self.key(guild_id, channel_id))
+        return self.store(guild_id, channel_id, data, generation)
+
+
+    async def set(self, guild_id: int, channel_id: int, **fields):
+        """Write settings, booleans are stored the same way the rest of the bot expects them."""
+        mapping = {name: str(value) if isinstance(value, bool) else value for name, value in fields.items()}
+        await self.redis.hset(self.key(guild_id, channel_id), mapping=mapping)
+        await self.bus.publish("settings", f"{guild_id}:{channel_id}")
+
+
+    async def delete(self, guild_id: int, channel_id: int, *fields: str):
+        await self.redis.hdel(self.key(guild_id, channel_id), *fields)
+        await self.bus.publish("settings", f"{guild_id}:{channel_id}")
@@ -0,0 +1,29 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one. While a call for a key is running, later callers
+    with the same key wait for its result instead of starting their own.
+    """
+    def __init__(self):
+        self.flights: Dict[Hashable, asyncio.Future] = {}
+
+
+    def __len__(self):
+        return len(self.flights)
+
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(factory())
+            self.flights[key] = flight
+            flight.add_done_callback(lambda _: self.flights.pop(key, None))
+
+        # one caller giving up must not cancel the call for everybody else
+        return await asyncio.shield(flight)
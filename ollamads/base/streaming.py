@@ -0,0 +1,255 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import asyncio
+import io
+import time
+from typing import List, Optional, Tuple
+
+import discord
+
+from ollamads.base.cache import LRUCache
+from ollamads.base.timing import StageTimings
+
+FENCE = "```"
+SPILL_NOTE = "\n\n*The full answer is attached.*"
+
+
+def strip_reasoning(text: str, final: bool = True) -> str:
+    """
+    Remove the <think> block emitted by reasoning models. While streaming (final=False)
+    nothing is shown until the reasoning block has been closed.
+    """
+    if "</think>" in text:
+        return text.split("</think>")[-1]
+
+    if not final:
+        head = text.lstrip()
+        # either inside an unfinished reasoning block or in the middle of receiving the opening tag
+        if head.startswith("<think>") or (head and "<think>".startswith(head)):
+            return ""
+
+    return text
+
+
+def find_cut(text: str, room: int) -> Tuple[int, int]:
+    """
+    Where to cut `text` so the first part fits in `room` characters: at a paragraph break, a line
+    break or a space in the second half of the room, mid-word only as a last resort. Returns the
+    position of the cut and how many separator characters to drop there.
+    """
+    window = text[:room + 1]
+    for separator in ("\n\n", "\n", " "):
+        position = window.rfind(separator, room // 2)
+        if position > 0:
+            return position, len(separator)
+    return room, 0
+
+
+def open_fence(chunk: str, language: Optional[str]) -> Optional[str]:
+    """The language of the code block still open at the end of `chunk`, None if there is none."""
+    for line in chunk.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith(FENCE):
+            language = stripped[len(FENCE):].strip() if language is None else None
+    return language
+
+
+def split_message(text: str, limit: int = 2000) -> List[str]:
+    """
+    Split a reply into messages of at most `limit` characters, preferably at paragraph or line
+    breaks. A code block that is cut in two is closed at the end of one message and opened again
+    (with the same language) at the start of the next one.
+    """
+    chunks = []
+    language = None
+    while text:
+        prefix = f"{FENCE}{language}\n" if language is not None else ""
+        room = limit - len(prefix)
+        if len(text) <= room:
+            chunks.append(prefix + text)
+            break
+
+        # leave space for closing a code block
+        cut, skip = find_cut(text, room - len(FENCE) - 1)
+        chunk = prefix + text[:cut]
+        language = open_fence(text[:cut], language)
+        if language is not None:
+            chunk += "\n" + FENCE
+        chunks.append(chunk)
+        text = text[cut + skip:]
+
+    return chunks
+
+
+class ChannelPacer:
+    """
+    Token bucket per channel that mirrors discord's message rate limit (about 5 messages per
+    5 seconds per channel), so replies are paced by the bot instead of running into 429s.
+    """
+    def __init__(self, rate: float = 1.0, burst: int = 5, max_channels: int = 4096):
+        self.rate = rate
+        self.burst = burst
+        # channel id -> [tokens, last refill]
+        self.buckets = LRUCache(max_items=max_channels)
+
+
+    def __bucket__(self, channel_id: int) -> list:
+        now = time.monotonic()
+        bucket = self.buckets.get(channel_id)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+            self.buckets.put(channel_id, bucket)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+
+    def try_acquire(self, channel_id: int) -> bool:
+        bucket = self.__bucket__(channel_id)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+
+    async def acquire(self, channel_id: int):
+        while not self.try_acquire(channel_id):
+            bucket = self.__bucket__(channel_id)
+            await asyncio.sleep((1 - bucket[0]) / self.rate)
+
+
+class StreamedReply:
+    """
+    Progressively delivers a model reply to a channel.
+
+    The first visible text is sent as soon as it arrives, after that the message is edited in place
+    at most once every `edit_interval` seconds to stay under discord's edit rate limits. Once the text
+    grows past `limit` characters the reply rolls over into a new message, split at paragraph or
+    code block boundaries (see `split_message`).
+
+    Sends and edits are paced per channel by `pacer`, intermediate edits are skipped instead of
+    waited for. A reply longer than `spill_threshold` characters stops rolling over, the complete
+    reply is attached as a file instead.
+    """
+    def __init__(self, ctx, edit_interval: float = 1.0, limit: int = 2000, redacted: List[str] = None, timings: StageTimings = None,
+                 pacer: ChannelPacer = None, spill_threshold: int = 0):
+        self.ctx = ctx
+        self.timings = timings or StageTimings()
+        self.pacer = pacer
+        self.spill_threshold = spill_threshold
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.redacted = redacted or []
+        self.raw = ""
+        self.messages = []
+        self.shown = []
+        self.last_flush = 0.0
+
+
+    @property
+    def reply(self) -> str:
+        """The reply with the reasoning removed, this is what ends up in the chat history."""
+        return strip_reasoning(self.raw)
+
+
+    def __redact__(self, text: str, final: bool) -> str:
+        for term in self.redacted:
+            text = text.replace(term, "[REDACTED]")
+
+        if final:
+            return text
+
+        # hold back the tail if it could be the start of a redacted term, the next chunk decides
+        hold = 0
+        for term in self.redacted:
+            for k in range(min(len(term) - 1, len(text)), hold, -1):
+                if text.endswith(term[:k]):
+                    hold = k
+                    break
+
+        return text[:len(text) - hold]
+
+
+    async def feed(self, chunk: str):
+        """
+        Add a streamed chunk, flushing it to discord if the coalescing timer allows it.
+        """
+        if not chunk:
+            return
+
+        self.raw += chunk
+        if not self.messages or time.monotonic() - self.last_flush >= self.edit_interval:
+            await self.flush()
+
+
+    async def finish(self, chunk: str = ""):
+        """
+        Add the last chunk (if any) and bring the messages up to date with the complete reply.
+        Returns False if there was nothing to show.
+        """
+        self.raw += chunk
+        await self.flush(final=True)
+        return len(self.messages) > 0
+
+
+    async def __pace__(self, wait: bool) -> bool:
+        if self.pacer is None:
+            return True
+        if not wait:
+            return self.pacer.try_acquire(self.ctx.channel.id)
+        await self.pacer.acquire(self.ctx.channel.id)
+        return True
+
+
+    async def flush(self, final: bool = False):
+        visible = self.__redact__(strip_reasoning(self.raw, final), final)
+        if not visible.strip():
+            return
+
+        spill = bool(self.spill_threshold) and len(visible) > self.spill_threshold
+        if spill and final and not self.messages:
+            # nothing was shown yet, the preview and the file go out together
+            preview = split_message(visible, self.limit - len(SPILL_NOTE))[0] + SPILL_NOTE
+            await self.__pace__(True)
+            with self.timings.stage("discord_send"):
+                self.messages.append(await self.ctx.respond(preview, file=self.__file__(visible)))
+            self.shown.append(preview)
+            return
+
+        chunks = split_message(visible, self.limit)
+        if spill:
+            # the messages already sent serve as the preview
+            chunks = chunks[:max(len(self.messages), 1)]
+
+        for i, chunk in enumerate(chunks):
+            if not chunk.strip():
+                break
+
+            if i < len(self.messages):
+                if self.shown[i] != chunk:
+                    if not await self.__pace__(final):
+                        return
+                    with self.timings.stage("discord_send"):
+                        await self.messages[i].edit(content=chunk)
+                    self.shown[i] = chunk
+            else:
+                # new messages are always sent, that is what makes the reply show up at all
+                await self.__pace__(True)
+                with self.timings.stage("discord_send"):
+                    self.messages.append(await self.ctx.respond(chunk))
+                self.shown.append(chunk)
+
+        if spill and final:
+            await self.__pace__(True)
+            with self.timings.stage("discord_send"):
+                self.messages.append(await self.ctx.respond(SPILL_NOTE.strip(), file=self.__file__(visible)))
+            self.shown.append(SPILL_NOTE.strip())
+
+        self.last_flush = time.monotonic()
+
+
+    @staticmethod
+    def __file__(text: str) -> discord.File:
+        return discord.File(io.BytesIO(text.encode("utf-8")), filename="reply.md")
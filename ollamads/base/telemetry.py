@@ -0,0 +1,129 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from ollamads.base.cache import LRUCache
+
+# a load this long means the model had to be read from disk, shorter ones are just bookkeeping
+COLD_LOAD_SECONDS = 0.5
+
+
+class InferenceSample:
+    """The timings ollama reports with the last chunk of a response, durations in seconds."""
+    def __init__(self, eval_count: int = 0, eval_duration: float = 0.0, prompt_eval_count: int = 0, prompt_eval_duration: float = 0.0,
+                 load_duration: float = 0.0, total_duration: float = 0.0, prompt_tokens: int = 0):
+        self.eval_count = eval_count
+        self.eval_duration = eval_duration
+        self.prompt_eval_count = prompt_eval_count
+        self.prompt_eval_duration = prompt_eval_duration
+        self.load_duration = load_duration
+        self.total_duration = total_duration
+        # estimated size of the whole prompt, ollama only counts the tokens it did not have cached
+        self.prompt_tokens = prompt_tokens
+        self.timestamp = time.monotonic()
+
+
+    @classmethod
+    def from_response(cls, response, prompt_tokens: int = 0) -> Optional["InferenceSample"]:
+        """None if the response carries no timings (not the final chunk, or an old server)."""
+        if response is None or not getattr(response, "total_duration", None):
+            return None
+
+        def seconds(name):
+            return (getattr(response, name, None) or 0) / 1e9
+
+        return cls(
+            getattr(response, "eval_count", None) or 0,
+            seconds("eval_duration"),
+            getattr(response, "prompt_eval_count", None) or 0,
+            seconds("prompt_eval_duration"),
+            seconds("load_duration"),
+            seconds("total_duration"),
+            prompt_tokens,
+        )
+
+
+class InferenceSummary:
+    def __init__(self, samples: List[InferenceSample]):
+        self.turns = len(samples)
+        eval_count = sum(sample.eval_count for sample in samples)
+        eval_duration = sum(sample.eval_duration for sample in samples)
+        prompt_count = sum(sample.prompt_eval_count for sample in samples)
+        prompt_duration = sum(sample.prompt_eval_duration for sample in samples)
+        loads = [sample.load_duration for sample in samples if sample.load_duration >= COLD_LOAD_SECONDS]
+
+        self.tokens_per_second = eval_count / eval_duration if eval_duration else 0.0
+        self.prompt_tokens_per_second = prompt_count / prompt_duration if prompt_duration else 0.0
+        self.prompt_tokens = prompt_count / self.turns if self.turns else 0.0
+        self.reply_tokens = eval_count / self.turns if self.turns else 0.0
+        self.cold_loads = len(loads)
+        self.load_seconds = sum(loads) / len(loads) if loads else 0.0
+        self.gpu_seconds = sum(sample.total_duration for sample in samples)
+
+        # share of the prompt that ollama did not have to evaluate again
+        estimated = [sample for sample in samples if sample.prompt_tokens]
+        total = sum(sample.prompt_tokens for sample in estimated)
+        evaluated = sum(sample.prompt_eval_count for sample in estimated)
+        self.prompt_cache = min(1.0, max(0.0, 1 - evaluated / total)) if total else None
+
+
+    def __str__(self):
+        text = (f"{self.turns} turns, {self.tokens_per_second:.1f} tokens/s, {self.prompt_tokens:.0f} prompt tokens evaluated per turn "
+                f"({self.prompt_tokens_per_second:.0f} tokens/s), {self.gpu_seconds:.1f} s busy")
+        if self.prompt_cache is not None:
+            text += f", about {self.prompt_cache:.0%} of the prompt cached"
+        if self.cold_loads:
+            text += f", {self.cold_loads} cold loads of {self.load_seconds:.1f} s"
+        return text
+
+
+class InferenceTelemetry:
+    """
+    Rolling windows of the last `window` responses per model and per channel, samples older than
+    `max_age` seconds are left out of the summaries.
+    """
+    def __init__(self, window: int = 100, max_age: float = 3600.0, max_channels: int = 1024):
+        self.window = window
+        self.max_age = max_age
+        self.models: Dict[str, Deque[InferenceSample]] = {}
+        self.channels = LRUCache(max_items=max_channels)
+
+
+    def record(self, model: str, response, guild_id: int = None, channel_id: int = None, prompt_tokens: int = 0) -> Optional[InferenceSample]:
+        sample = InferenceSample.from_response(response, prompt_tokens)
+        if sample is None:
+            return None
+
+        self.models.setdefault(model, deque(maxlen=self.window)).append(sample)
+        if channel_id is not None:
+            samples = self.channels.get((guild_id, channel_id))
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self.channels.put((guild_id, channel_id), samples)
+            samples.append(sample)
+        return sample
+
+
+    def __recent__(self, samples) -> List[InferenceSample]:
+        cutoff = time.monotonic() - self.max_age
+        return [sample for sample in samples or () if sample.timestamp >= cutoff]
+
+
+    def model(self, model: str) -> Optional[InferenceSummary]:
+        samples = self.__recent__(self.models.get(model))
+        return InferenceSummary(samples) if samples else None
+
+
+    def channel(self, guild_id: int, channel_id: int) -> Optional[InferenceSummary]:
+        samples = self.__recent__(self.channels.get((guild_id, channel_id)))
+        return InferenceSummary(samples) if samples else None
+
+
+    def busiest_models(self, count: int = 5) -> List[Tuple[str, InferenceSummary]]:
+        """The models that kept ollama busy the longest recently."""
+        summaries = [(model, self.model(model)) for model in list(self.models)]
+        summaries = [(model, summary) for model, summary in summaries if summary]
+        return sorted(summaries, key=lambda item: item[1].gpu_seconds, reverse=True)[:count]
@@ -0,0 +1,34 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import contextlib
+import time
+from typing import Callable, List
+
+
+class StageTimings:
+    """
+    Hook for measuring how long the stages of handling a message take (loading the context, fetching
+    images, waiting for and running inference, sending to discord, ...). Every measurement is passed to
+    the subscribed observers as (stage, seconds), without observers it costs next to nothing.
+    """
+    def __init__(self):
+        self.observers: List[Callable[[str, float], None]] = []
+
+
+    def subscribe(self, observer: Callable[[str, float], None]):
+        self.observers.append(observer)
+
+
+    def observe(self, stage: str, seconds: float):
+        for observer in self.observers:
+            observer(stage, seconds)
+
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
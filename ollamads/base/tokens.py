@@ -0,0 +1,76 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+from typing import List, Optional
+
+# rough cost of the framing around every message (role, separators, ...)
+MESSAGE_OVERHEAD = 4
+# vision encoders turn an image into a few hundred tokens, this errs on the large side
+IMAGE_TOKENS = 768
+# once a chat no longer fits it is cut down to this share of the budget, the following turns then
+# append to an unchanged prompt prefix for a while and ollama can reuse its prompt cache
+TRIM_TARGET = 0.6
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast token estimate, most tokenizers average about 4 characters per token on english text.
+    """
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: dict) -> int:
+    return MESSAGE_OVERHEAD + estimate_tokens(message.get("content") or "") + IMAGE_TOKENS * len(message.get("images") or [])
+
+
+def context_length(info: Optional[dict]) -> Optional[int]:
+    """
+    Get the context length of a model from an /api/show response. A num_ctx parameter set in the
+    modelfile takes precedence over the context length the model was trained with.
+    """
+    if not info:
+        return None
+
+    for line in (info.get("parameters") or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "num_ctx" and parts[1].isdigit():
+            return int(parts[1])
+
+    model_info = info.get("model_info") or {}
+    architecture = model_info.get("general.architecture")
+    if architecture and isinstance(model_info.get(f"{architecture}.context_length"), int):
+        return model_info[f"{architecture}.context_length"]
+
+    for key, value in model_info.items():
+        if key.endswith(".context_length") and isinstance(value, int):
+            return value
+
+    return None
+
+
+def fit_to_budget(messages: List[dict], budget: int, target: float = TRIM_TARGET) -> List[dict]:
+    """
+    Make the estimated size of the chat fit in `budget` tokens. Nothing is dropped while it fits,
+    once it doesn't the oldest messages are dropped until it is down to `target` of the budget.
+    The system messages at the start and the newest message are always kept, and the dropped
+    messages never leave an assistant reply at the start of the history.
+    """
+    leading = 1
+    while leading < len(messages) and messages[leading].get("role") == "system":
+        leading += 1
+    system, history = messages[:leading], messages[leading:]
+    total = sum(message_tokens(message) for message in messages)
+    if total <= budget:
+        return messages
+
+    goal = budget * target
+    start = 0
+    while total > goal and start < len(history) - 1:
+        total -= message_tokens(history[start])
+        start += 1
+        # don't start the history with the reply to a message that was just dropped
+        while start < len(history) - 1 and history[start].get("role") == "assistant":
+            total -= message_tokens(history[start])
+            start += 1
+
+    return system + history[start:]
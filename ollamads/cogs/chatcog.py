@@ -6,19 +6,37 @@ import discord
 import asyncio
 import json
 import re
-import io
-import base64
-import aiohttp
 import tempfile
+import hashlib
+import time
 import datetime
 from enum import IntEnum
-from typing import List, Dict
+from collections import Counter
 from datetime import datetime
 from discord.ext import commands
 from urllib.parse import urlparse, parse_qs
-from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from ollama import AsyncClient
-from PIL import Image
+from ollamads.base.streaming import ChannelPacer, StreamedReply, strip_reasoning
+from ollamads.base.pubsub import InvalidationBus
+from ollamads.base.admission import AdmissionIndex
+from ollamads.base.images import process_image
+from ollamads.base.cache import LRUCache
+from ollamads.base.history import Conversation, HistoryStore
+from ollamads.base.compaction import Compactor
+from ollamads.base.tokens import fit_to_budget, message_tokens
+from ollamads.base.scheduler import InferenceScheduler
+from ollamads.base.singleflight import SingleFlight
+from ollamads.base.residency import ResidencyManager
+from ollamads.base.models import ModelRegistry
+from ollamads.base.timing import StageTimings
+from ollamads.base.telemetry import InferenceTelemetry
+from ollamads.base.settings import ChannelSettings, SettingsCache
+
+
+# never let the model ping or name these
+REDACTED_MENTIONS = ["<@265651045911232512>", "<@!265651045911232512>", "@dragon_enjoyer", "@Derg"]
 
 
 class ChatAdminCommandsEnum(IntEnum):
@@ -75,6 +93,26 @@ class BanObject:
             "server_ban": self.server_ban
         }
 
+    @classmethod
+    def from_json(cls, data: str):
+        """Parse a ban entry as stored in the guild:{id}:admin hash, returns None if it is invalid."""
+        if not data:
+            return None
+        try:
+            return cls(**json.loads(data))
+        except (json.JSONDecodeError, TypeError):
+            return None
+
+
+class ConversationContext:
+    """
+    Everything needed to decide on and answer a single message, loaded in one redis round trip.
+    """
+    def __init__(self, settings: ChannelSettings, blocked: bool, conversation: Conversation):
+        self.settings = settings
+        self.blocked = blocked
+        self.conversation = conversation
+
 
 class ChatCommands(commands.Cog):
     """
@@ -87,13 +125,53 @@ class ChatCommands(commands.Cog):
         self.vetted_users = self.bot.vetted_users
         self.redis = self.bot.redis
         self.ollama = self.bot.ollama
-        self.pp = ProcessPoolExecutor(max_workers=1)    
-        self.sep = asyncio.Semaphore(2)
+        # image decoding and resizing never runs on the event loop
+        if self.bot.image_executor == "thread":
+            self.pp = ThreadPoolExecutor(max_workers=self.bot.image_workers)
+        else:
+            self.pp = ProcessPoolExecutor(max_workers=self.bot.image_workers, mp_context=multiprocessing.get_context("forkserver"))
+        # how long the stages of answering a message take, for benchmarks and metrics
+        self.timings = StageTimings()
+        # messages seen and answered, rejections by reason, messages being handled right now
+        self.message_counts = Counter()
+        self.rejections = Counter()
+        self.in_flight = 0
+        # replies are paced per channel to stay under discord's rate limits
+        self.pacer = ChannelPacer()
+        # generation speed, prompt sizes and model loads as reported by ollama
+        self.telemetry = InferenceTelemetry()
+        # every ollama request waits for a slot here, slots are shared fairly between guilds and users
+        self.scheduler = InferenceScheduler(self.bot.ollama_concurrency, self.bot.guild_weights, self.timings)
+        # identical requests that are already running are joined instead of sent again
+        self.flights = SingleFlight()
         self.ll = asyncio.get_event_loop()     
         self.max_history = 20
-        self.models = None
-        
-        bot.loop.create_task(self.__load_models_async__())
+        self.history = HistoryStore(self.redis, self.max_history)
+        # the ollama catalogue with the capabilities of every model, kept up to date in the background
+        self.models = ModelRegistry(self.ollama, self.__get_model_info__, self.bot.model_refresh_interval)
+        # every ollama request is sent with the context length of its model
+        self.ollama.context_length = self.__context_length__
+        # channel settings are cached in memory, writes are broadcast to other bot processes
+        self.bus = InvalidationBus(self.redis)
+        self.settings = SettingsCache(self.redis, self.bus)
+        self.admission = AdmissionIndex(self.bus)
+        # descriptions made by the vision fallback model, shared with other processes through redis
+        self.vision_cache = LRUCache(max_items=256, ttl=self.bot.vision_cache_ttl)
+        # processed images, attachment identity -> content hash -> encoded image
+        self.image_ids = LRUCache(max_items=4096)
+        self.image_cache = LRUCache(max_items=4096, max_size=self.bot.image_cache_size)
+        # messages fetched because they were replied to, busy reply threads point at the same few
+        self.referenced = LRUCache(max_items=1024, ttl=60)
+        self.bus.start(bot.loop)
+        # keeps the models of active channels loaded
+        self.residency = ResidencyManager(self.redis, self.ollama, self.scheduler, self.bot.keep_alive, self.bot.model_keep_alive,
+                                          self.bot.preload_models, self.bot.preload_idle_hours, self.bot.preload_interval)
+        self.residency.start(bot.loop)
+        self.models.start(bot.loop)
+        # summarizes the oldest turns of long conversations
+        self.compactor = Compactor(self.history, self.ollama, self.scheduler, self.bot.summary_model, self.bot.summary_threshold,
+                                   self.bot.summary_keep, self.residency.keep_alive(self.bot.summary_model), self.telemetry)
+        bot.loop.create_task(self.__build_history_index__())
 
 
     @commands.guild_only()
@@ -185,18 +263,7 @@ class ChatCommands(commands.Cog):
         """
         Get the ban object for a specific user. Returns None if the user is not banned.
         """
-        user_obj = None
-
-        if await self.redis.exists(redis_key):
-            user_obj = await self.redis.hget(redis_key, user.id)
-            if user_obj:
-                try:
-                    user_obj = json.loads(user_obj)
-                    user_obj = BanObject(**user_obj)
-                except json.JSONDecodeError:
-                    user_obj = None
-
-        return user_obj
+        return BanObject.from_json(await self.redis.hget(redis_key, user.id))
     
 
     async def __create_ban_object__(self, redis_key: str, user: discord.Member, reason: str, channels: list, issuer_id: int, server_ban: bool = False, create_new: bool = False):
@@ -241,6 +308,7 @@ class ChatCommands(commands.Cog):
             return await ctx.respond("User is banned in the entire server.", ephemeral=True)
 
         await self.redis.hset(redis_key, user_obj.user_id, json.dumps(user_obj.to_dict()))
+        await self.admission.ban(ctx.guild.id, user_obj.user_id, user_obj.channels)
         await ctx.respond(f"{user.mention} is now banned from using {self.bot.user.mention} in {ctx.channel.mention}.")
 
 
@@ -259,10 +327,12 @@ class ChatCommands(commands.Cog):
         # if its the only channel, remove the ban object from redis
         if len(user_obj.channels) == 1 and user_obj.channels[0] == ctx.channel.id:
             await self.redis.hdel(redis_key, user.id)
+            await self.admission.unban(ctx.guild.id, user.id)
         else:
             # delete all the channels that match the current channel
             user_obj.channels = [channel for channel in user_obj.channels if channel != ctx.channel.id]                
             await self.redis.hset(redis_key, user.id, json.dumps(user_obj.to_dict()))
+            await self.admission.ban(ctx.guild.id, user.id, user_obj.channels)
             
         await ctx.respond(f"{user.mention} is now unbanned from using {self.bot.user.mention} in {ctx.channel.mention}.")
 
@@ -280,6 +350,7 @@ class ChatCommands(commands.Cog):
             return await ctx.respond("User is already banned in the entire server.", ephemeral=True)
 
         await self.redis.hset(redis_key, user_obj.user_id, json.dumps(user_obj.to_dict()))
+        await self.admission.ban(ctx.guild.id, user_obj.user_id, None, server_ban=True)
         await ctx.respond(f"{user.mention} is now banned from using {self.bot.user.mention} in ***{ctx.guild.name}***.")
 
 
@@ -295,6 +366,7 @@ class ChatCommands(commands.Cog):
         
         # remove the ban object from redis
         await self.redis.hdel(redis_key, user.id)
+        await self.admission.unban(ctx.guild.id, user.id)
         await ctx.respond(f"{user.mention} is now unbanned from using {self.bot.user.mention} in ***{ctx.guild.name}***.")
 
 
@@ -311,16 +383,13 @@ class ChatCommands(commands.Cog):
         except:
             return await ctx.respond("Invalid user ID.", ephemeral=True)
 
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:user:{user}:history"
-        chat_history = await self.redis.hget(redis_key, "chat_history")
+        conversation = await self.history.load(ctx.guild.id, ctx.channel.id, user)
 
-        if not chat_history:
+        if not conversation.messages:
             return await ctx.respond("No chat history found for this user.", ephemeral=True)
 
-        chat_history = json.loads(chat_history)
-        # remove the first entry which is the system prompt
-        chat_history.pop(0)
-        chat_history = json.dumps(chat_history, indent=4)
+        # the system prompt is not part of the messages
+        chat_history = json.dumps(conversation.messages, indent=4)
 
         # create a temporary file to send the chat history
         with tempfile.NamedTemporaryFile(mode="w", delete=False, newline="\n", suffix=".json") as f:
@@ -404,10 +473,9 @@ class ChatCommands(commands.Cog):
         """
         Add a user to the whitelist.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        whitelist = await self.redis.hget(redis_key, "whitelist")
+        settings = await self.settings.get(ctx.guild.id, ctx.channel.id)
 
-        if whitelist == "False":
+        if settings.whitelist is False:
             return await ctx.respond("Whitelist is disabled.", ephemeral=True)
 
         redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:whitelist"
@@ -415,6 +483,7 @@ class ChatCommands(commands.Cog):
             return await ctx.respond(f"{user.mention} is already in the whitelist.", ephemeral=True)
         
         await self.redis.sadd(redis_key, user.id)
+        await self.admission.whitelist(ctx.guild.id, ctx.channel.id, user.id, True)
         await ctx.respond(f"{user.mention} is now added to the whitelist.")
 
 
@@ -422,10 +491,9 @@ class ChatCommands(commands.Cog):
         """
         Remove a user from the whitelist.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        whitelist = await self.redis.hget(redis_key, "whitelist")
+        settings = await self.settings.get(ctx.guild.id, ctx.channel.id)
 
-        if whitelist == "False":
+        if settings.whitelist is False:
             return await ctx.respond("Whitelist is disabled.", ephemeral=True)
 
         redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:whitelist"
@@ -433,6 +501,7 @@ class ChatCommands(commands.Cog):
             return await ctx.respond(f"{user.mention} is not in the whitelist.", ephemeral=True)
         
         await self.redis.srem(redis_key, user.id)
+        await self.admission.whitelist(ctx.guild.id, ctx.channel.id, user.id, False)
         await ctx.respond(f"{user.mention} is now removed from the whitelist.")
 
 
@@ -440,10 +509,9 @@ class ChatCommands(commands.Cog):
         """
         List the users in the whitelist.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        whitelist = await self.redis.hget(redis_key, "whitelist")
+        settings = await self.settings.get(ctx.guild.id, ctx.channel.id)
 
-        if whitelist == "False":
+        if settings.whitelist is False:
             return await ctx.respond("Whitelist is disabled.", ephemeral=True)
 
         redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:whitelist"
@@ -473,8 +541,11 @@ class ChatCommands(commands.Cog):
         """
         This command is used to reload the model list.
         """
-        await self.__load_models_async__()
-        await ctx.respond("Model list reloaded.")
+        try:
+            added, removed, changed = await self.models.refresh()
+        except Exception as e:
+            return await ctx.respond(f"Failed to reload the model list: {e}", ephemeral=True)
+        await ctx.respond(f"Model list reloaded, {len(added)} added, {len(removed)} removed, {len(changed)} changed.")
 
 
     async def __list__(self, ctx: discord.ApplicationContext):
@@ -488,13 +559,37 @@ class ChatCommands(commands.Cog):
         """
         Get full model information via a direct request to the ollama API.
         """
-        url = f"{self.bot.ollama_server}/api/show"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json={"name": model_name}) as response:
-                if response.status != 200:
-                    return None
-                data = await response.json()
-                return data
+        return await self.flights.do(("show", model_name), lambda: self.__fetch_model_info__(model_name))
+
+
+    async def __fetch_model_info__(self, model_name):
+        return await self.ollama.model_info(model_name)
+
+
+    def __context_length__(self, model: str) -> int:
+        """
+        The number of tokens the model gets to work with, capped by the max context tokens setting.
+        """
+        info = self.models.get(model)
+        if info is None or not info.context_length:
+            # not looked up yet, ollama's own default
+            return min(4096, self.bot.max_context_tokens)
+
+        return min(info.context_length, self.bot.max_context_tokens)
+
+
+    async def __find_model__(self, name: str):
+        """
+        Look up a model name typed by a user, the catalogue is synced first if the model is not known yet.
+        """
+        info = self.models.find(name)
+        if info is None:
+            try:
+                await self.models.refresh()
+            except Exception as e:
+                print(f"Failed to load models: {e}")
+            info = self.models.find(name)
+        return info
 
 
     async def __set__(self, ctx: discord.ApplicationContext, model = ''):
@@ -504,68 +599,63 @@ class ChatCommands(commands.Cog):
         if not model:
             return await ctx.respond("Please provide a model name.", ephemeral=True)
 
-        model = model.lower().strip()
+        info = await self.__find_model__(model)
 
         if not self.models:
-            return await ctx.respond("No models are available at the moment. Please try again later.", ephermeral=True)
-
-        valid_models = {m["model"].lower(): m["model"] for m in self.models}
+            return await ctx.respond("No models are available at the moment. Please try again later.", ephemeral=True)
 
-        if model not in valid_models:
+        if info is None:
             return await ctx.respond(
-                f"Invalid model name. Available models: {', '.join(valid_models.values())}",
+                f"Invalid model name. Available models: {', '.join(m.name for m in self.models)}",
                 ephemeral=True
             )
 
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        await self.redis.hset(redis_key, "model", valid_models[model])
+        if info.vision is None:
+            # the details of the model couldn't be looked up yet
+            await self.models.describe(info)
+        if info.vision is None:
+            return await ctx.respond(f"Could not find out whether **{info.name}** is vision capable. Please try again later.", ephemeral=True)
 
-        info = await self.__get_model_info__(valid_models[model])
-        is_vision = any("vision" in str(key) or (isinstance(value, dict) and any("vision" in str(k) for k in value.keys())) for key, value in info.items())
-        await self.redis.hset(redis_key, "vision", str(is_vision))
+        is_vision = info.vision
+        await self.settings.set(ctx.guild.id, ctx.channel.id, model=info.name, vision=is_vision)
 
-        await ctx.respond(f"Model set to **{valid_models[model]}**, vision capable: {is_vision}.")
+        await ctx.respond(f"Model set to **{info.name}**, vision capable: {is_vision}.")
 
 
     async def __get__(self, ctx: discord.ApplicationContext):
         """
         This command is used to get the selected model for a specific channel.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        model = await self.redis.hget(redis_key, "model")
+        settings = await self.settings.get(ctx.guild.id, ctx.channel.id)
 
-        if not model:
+        if not settings.model:
             return await ctx.respond("No model selected for this channel.")
 
-        await ctx.respond(f"Model selected for this channel: **{model}**, vision capable: {await self.redis.hget(redis_key, 'vision')}.")
+        await ctx.respond(f"Model selected for this channel: **{settings.model}**, vision capable: {settings.vision}.")
 
 
     async def __set__fallback__vision__(self, ctx: discord.ApplicationContext, model = ''):
         """
         Configure a fallback model for vision capabilities, in case the primary model is not vision capable.
         """
-        redis_key_settings = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-
         if model == "" or not model or model.lower() == "none":
-            await self.redis.hdel(redis_key_settings, "vision_fallback")
+            await self.settings.delete(ctx.guild.id, ctx.channel.id, "vision_fallback")
             return await ctx.respond("Vision fallback model disabled.")
         else:
-            model = model.lower().strip()
+            info = await self.__find_model__(model)
 
             if not self.models:
                 return await ctx.respond("No models are available at the moment. Please try again later.", ephemeral=True)
-            
-            valid_models = {m["model"].lower(): m["model"] for m in self.models}
 
-            if model not in valid_models:
+            if info is None:
                 return await ctx.respond(
-                    f"Invalid model name. Available models: {', '.join(valid_models.values())}",
+                    f"Invalid model name. Available models: {', '.join(m.name for m in self.models)}",
                     ephemeral=True
                 )
         
-            await self.redis.hset(redis_key_settings, "vision_fallback", valid_models[model])
+            await self.settings.set(ctx.guild.id, ctx.channel.id, vision_fallback=info.name)
 
-            await ctx.respond(f"Vision fallback model set to **{valid_models[model]}**.")
+            await ctx.respond(f"Vision fallback model set to **{info.name}**.")
 
 
     async def __prompt__(self, ctx: discord.ApplicationContext, message: str = ""):
@@ -573,18 +663,16 @@ class ChatCommands(commands.Cog):
         Get or Set the system prompt for the model, for this specific channel.
         """
         if message is None or message == "":
-            redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-            prompt = await self.redis.hget(redis_key, "prompt")
+            prompt = (await self.settings.get(ctx.guild.id, ctx.channel.id)).prompt
 
             if not prompt:
                 prompt = self.default_prompt
-                await self.redis.hset(redis_key, "prompt", prompt)
+                await self.settings.set(ctx.guild.id, ctx.channel.id, prompt=prompt)
 
             await ctx.respond(f"Current prompt: ```{prompt}```")
 
         else:
-            redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-            await self.redis.hset(redis_key, "prompt", message)
+            await self.settings.set(ctx.guild.id, ctx.channel.id, prompt=message)
             await ctx.respond(f"Prompt set to: ```{message}```")
 
 
@@ -592,20 +680,17 @@ class ChatCommands(commands.Cog):
         """
         Get or set the system prompt for the vision model, for this specific channel.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        
         if message is None or message == "":
-
-            prompt = await self.redis.hget(redis_key, "vision_prompt")
+            prompt = (await self.settings.get(ctx.guild.id, ctx.channel.id)).vision_prompt
 
             if not prompt:
                 prompt = self.default_vision_prompt
-                await self.redis.hset(redis_key, "vision_prompt", prompt)
+                await self.settings.set(ctx.guild.id, ctx.channel.id, vision_prompt=prompt)
 
             await ctx.respond(f"Current vision fallback prompt: ```{prompt}```")
 
         else:
-            await self.redis.hset(redis_key, "vision_prompt", message)
+            await self.settings.set(ctx.guild.id, ctx.channel.id, vision_prompt=message)
             await ctx.respond(f"Vision fallback prompt set to: ```{message}```")
 
 
@@ -613,30 +698,18 @@ class ChatCommands(commands.Cog):
         """
         This command is used to enable or disable bot-to-bot communication.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        bot2bot = await self.redis.hget(redis_key, "bot2bot")
-        
-        if bot2bot == "True":
-            bot2bot = "False"
-        else:
-            bot2bot = "True"
+        settings = await self.settings.get(ctx.guild.id, ctx.channel.id)
+        bot2bot = settings.bot2bot is not True
 
-        await self.redis.hset(redis_key, "bot2bot", bot2bot)
-        await ctx.respond(f"Bot2Bot communication is now {'enabled' if bot2bot == "True" else 'disabled'}.")
+        await self.settings.set(ctx.guild.id, ctx.channel.id, bot2bot=bot2bot)
+        await ctx.respond(f"Bot2Bot communication is now {'enabled' if bot2bot else 'disabled'}.")
 
 
     async def __admin_clear__(self, ctx: discord.ApplicationContext):
         """
         Clear the chat history for this channel.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:user:*:history"
-        keys = []
-        async for key in self.redis.scan_iter(redis_key):
-            keys.append(key)
-
-        for key in keys:
-            await self.redis.hdel(key, "chat_history")
-
+        await self.history.clear_channel(ctx.guild.id, ctx.channel.id)
         await ctx.respond("The entire chat history is cleared for this channel.")
 
 
@@ -645,35 +718,16 @@ class ChatCommands(commands.Cog):
         Get the status of the bot.
         """
         
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        model = await self.redis.hget(redis_key, "model")
-        vision = await self.redis.hget(redis_key, "vision")
-        vision_fallback = await self.redis.hget(redis_key, "vision_fallback")
-        bot2bot = await self.redis.hget(redis_key, "bot2bot")
+        settings = await self.settings.get(ctx.guild.id, ctx.channel.id)
         
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:user:*:history"
-        keys = {}
-        async for key in self.redis.scan_iter(redis_key):
-            user_id = int(key.split(":")[5])
-            keys[user_id] = key
-            
-        # get the length of the chat history from each user
-        chat_history = {}
-        for user_id, key in keys.items():
-            chat_history[user_id] = await self.redis.hget(key, "chat_history")
-            if chat_history[user_id]:
-                chat_history[user_id] = json.loads(chat_history[user_id])
-            else:
-                chat_history[user_id] = None
+        # the length of the chat history of each user, from the channel's conversation index
+        chat_history = await self.history.lengths(ctx.guild.id, ctx.channel.id)
 
         # build the chat history
         history = ""
-        for user_id, user_history in chat_history.items():
-            length = len(user_history) if user_history else 0
-            # hide the system prompt
+        for user_id, length in chat_history.items():
             if length > 0:
-                length - 1
-            history += f"<@{user_id}> has {len(user_history)} entries (max {self.max_history})\n"
+                history += f"<@{user_id}> has {length} entries (max {self.max_history})\n"
                 
         # build an embed
         embed = discord.Embed(
@@ -684,30 +738,55 @@ class ChatCommands(commands.Cog):
 
         embed.add_field(
             name="Model",
-            value=model if model else "Not set",
+            value=settings.model if settings.model else "Not set",
             inline=False
         )
 
-        if vision:
+        if settings.vision is not None:
             embed.add_field(
                 name="Vision Capable",
-                value="Enabled" if vision == "True" else "False",
+                value="Enabled" if settings.vision else "False",
                 inline=False
             )
 
-        if vision == "False":
+        if settings.vision is False:
             embed.add_field(
                 name="Vision Fallback",
-                value=vision_fallback if vision_fallback else "Disabled",
+                value=settings.vision_fallback if settings.vision_fallback else "Disabled",
                 inline=False
             )
 
         embed.add_field(
             name="Bot2Bot",
-            value=bot2bot if bot2bot else "Not set",
+            value=str(settings.bot2bot) if settings.bot2bot is not None else "Not set",
+            inline=False
+        )
+
+        inference = self.telemetry.channel(ctx.guild.id, ctx.channel.id)
+        if inference:
+            embed.add_field(
+                name="Inference (last hour)",
+                value=str(inference),
+                inline=False
+            )
+
+        embed.add_field(
+            name="Queue",
+            value=f"{self.scheduler.running} running, {self.scheduler.queued} waiting, average wait {self.scheduler.average_wait():.1f} s",
             inline=False
         )
 
+        if len(self.ollama.backends) > 1:
+            servers = ""
+            for backend in self.ollama.backends:
+                state = "up" if backend.healthy else "down"
+                servers += f"{backend.host}: {state}, {backend.outstanding} running\n"
+            embed.add_field(
+                name="Ollama Servers",
+                value=servers,
+                inline=False
+            )
+
         embed.add_field(
             name="Chat History",
             value=history if history else "No chat history yet!",
@@ -721,53 +800,93 @@ class ChatCommands(commands.Cog):
         """
         Enable or disable the whitelist for the bot.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        whitelist = await self.redis.hget(redis_key, "whitelist")
+        settings = await self.settings.get(ctx.guild.id, ctx.channel.id)
+        whitelist = settings.whitelist is not True
 
-        if whitelist == "True":
-            whitelist = "False"
-        else:
-            whitelist = "True"
-
-        await self.redis.hset(redis_key, "whitelist", whitelist)
-        await ctx.respond(f"Whitelist is now {'enabled' if whitelist == 'True' else 'disabled'}.")
+        await self.settings.set(ctx.guild.id, ctx.channel.id, whitelist=whitelist)
+        await ctx.respond(f"Whitelist is now {'enabled' if whitelist else 'disabled'}.")
         
 
     async def __clear__(self, ctx: discord.ApplicationContext):
         """
         Clear your chat history for this channel.
         """
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:user:{ctx.author.id}:history"
-        await self.redis.hdel(redis_key, "chat_history")
+        await self.history.clear(ctx.guild.id, ctx.channel.id, ctx.author.id)
         await ctx.respond("Chat history cleared.", ephemeral=True)
         
 
-    async def __check_ban_or_whitelist__(self, ctx: discord.ApplicationContext, user: discord.Member):
+    async def __build_history_index__(self):
+        try:
+            await self.history.build_index()
+        except Exception as e:
+            print(f"Failed to index the chat histories: {e}")
+
+
+    async def __load_context__(self, guild_id: int, channel_id: int, user_id: int, history: bool = True) -> ConversationContext:
+        """
+        Load whatever is not cached yet of the ban list, the channel whitelist, the channel settings
+        and (optionally) the chat history of a user in a single pipelined round trip.
+        """
+        settings_generation = self.settings.generation
+        admission_generation = self.admission.generation
+        settings = self.settings.peek(guild_id, channel_id)
+        load_bans = not self.admission.has_bans(guild_id)
+        load_whitelist = (settings is None or settings.whitelist) and not self.admission.has_whitelist(guild_id, channel_id)
+        conversation = None
+
+        if load_bans or load_whitelist or history or settings is None:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                if load_bans:
+                    pipe.hgetall(f"guild:{guild_id}:admin")
+                if load_whitelist:
+                    pipe.smembers(f"guild:{guild_id}:channel:{channel_id}:whitelist")
+                if history:
+                    self.history.queue_load(pipe, guild_id, channel_id, user_id)
+                if settings is None:
+                    pipe.hgetall(SettingsCache.key(guild_id, channel_id))
+                results = await pipe.execute()
+
+            if load_bans:
+                self.admission.load_bans(guild_id, results.pop(0), admission_generation)
+            if load_whitelist:
+                self.admission.load_whitelist(guild_id, channel_id, results.pop(0), admission_generation)
+            if history:
+                conversation = HistoryStore.parse(results)
+            if settings is None:
+                settings = self.settings.store(guild_id, channel_id, results.pop(0), settings_generation)
+
+        blocked = self.admission.blocked(guild_id, channel_id, user_id, settings.whitelist)
+        if blocked is None:
+            # the index could not be used (it raced an invalidation or pub/sub is down), ask redis
+            blocked = await self.__check_ban_or_whitelist__(guild_id, channel_id, user_id, settings)
+
+        return ConversationContext(settings, blocked, conversation)
+
+
+    async def __check_ban_or_whitelist__(self, guild_id: int, channel_id: int, user_id: int, settings: ChannelSettings):
         """
         Check if a user is banned from using the bot.
         """
-        redis_user_key = f"guild:{ctx.guild.id}:admin"
-        user_obj = await self.__get_ban_object__(redis_user_key, user)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hget(f"guild:{guild_id}:admin", user_id)
+            pipe.sismember(f"guild:{guild_id}:channel:{channel_id}:whitelist", user_id)
+            user_obj, whitelisted = await pipe.execute()
 
+        user_obj = BanObject.from_json(user_obj)
         if user_obj:
             if user_obj.server_ban:
                 return True
             
-            if ctx.channel.id in user_obj.channels:                
+            if channel_id in user_obj.channels:                
                 return True
-            
-        redis_whitelist_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        whitelist = await self.redis.hget(redis_whitelist_key, "whitelist")
 
-        if whitelist == "True":
-            redis_channel_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:whitelist"
-            if not await self.redis.sismember(redis_channel_key, user.id):
-                return True
+        if settings.whitelist and not whitelisted:
+            return True
             
         return False
     
 
-    async def __get_any_image__(self, ctx, message):
+    async def __get_any_image__(self, ctx, message, referenced_message=None):
         image_url_list = []
         image_url = ""
         image_url_pattern = r"https:\/\/media\.discordapp\.net\/attachments[^\s]*(?:jpg|jpeg|png|gif|webp)"
@@ -787,16 +906,13 @@ class ChatCommands(commands.Cog):
         if match:
             image_url_list.append(match.group(0))
             
-        if message.reference and message.reference.message_id: 
-            reference_message = await ctx.channel.fetch_message(message.reference.message_id)
-
-            referenced_message = await message.channel.fetch_message(message.reference.message_id)
+        if referenced_message is not None:
             match = re.search(image_url_pattern, referenced_message.content)
             if match:
                 image_url_list.append(match.group(0))
 
-            if reference_message.attachments:
-                image_url = reference_message.attachments[0].url
+            if referenced_message.attachments:
+                image_url = referenced_message.attachments[0].url
 
             if referenced_message.embeds:
                 for embed in referenced_message.embeds:
@@ -814,93 +930,196 @@ class ChatCommands(commands.Cog):
             return image_url
 
 
+    async def __resolve_reference__(self, message):
+        """
+        The message `message` replies to, None if it isn't a reply or the message is gone. Discord
+        usually sends it along, otherwise the client cache and the recently fetched messages are
+        checked before it is fetched, concurrent replies to the same message share one fetch.
+        """
+        reference = message.reference
+        if not (reference and reference.message_id):
+            return None
+        if isinstance(reference.resolved, discord.Message):
+            return reference.resolved
+        if isinstance(reference.resolved, discord.DeletedReferencedMessage):
+            return None
+
+        message_id = reference.message_id
+        referenced = self.bot.get_message(message_id) or self.referenced.get(message_id)
+        if referenced is not None:
+            return referenced
+
+        try:
+            with self.timings.stage("discord_fetch"):
+                referenced = await self.flights.do(("message", message_id), lambda: message.channel.fetch_message(message_id))
+        except discord.NotFound:
+            return None
+        self.referenced.put(message_id, referenced)
+        return referenced
+
+
+    def __addressed__(self, message: discord.Message) -> bool:
+        """
+        Cheap pre-filter for on_message, only uses what is already in memory. Returns False for
+        messages that can't be meant for the bot so they are dropped before any redis or API call.
+        """
+        if not message.guild or message.author == self.bot.user:
+            return False
+        if message.content == "" and not message.attachments:
+            return False
+
+        mentioned = self.bot.user in message.mentions
+        reference = message.reference
+        if not mentioned:
+            if not (reference and reference.message_id):
+                return False
+            # a reply to somebody else that doesn't mention the bot
+            if isinstance(reference.resolved, discord.Message) and reference.resolved.author != self.bot.user:
+                return False
+
+        if message.author.bot:
+            settings = self.settings.peek(message.guild.id, message.channel.id)
+            if settings is not None and settings.bot2bot is False:
+                return False
+
+        return True
+
+
     @commands.Cog.listener()
     async def on_message(self, message):
         """
         Listen for messages and respond to mentions.
         """
-        ctx = await self.bot.get_context(message)
-
-        if not message.guild:
+        self.message_counts["seen"] += 1
+        if not self.__addressed__(message):
+            self.rejections["not_addressed"] += 1
             return
-        if message.content == "" and not message.attachments:
-            return
-        
-        redis_key = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        allow_bots = await self.redis.hget(redis_key, "bot2bot")
 
-        if message.author.bot and (allow_bots == "False"):
-            return
-        elif message.author == self.bot.user:
+        self.in_flight += 1
+        try:
+            with self.timings.stage("message"):
+                await self.__handle_message__(message)
+        finally:
+            self.in_flight -= 1
+
+
+    async def __handle_message__(self, message):
+        ctx = await self.bot.get_context(message)
+        with self.timings.stage("context"):
+            context = await self.__load_context__(ctx.guild.id, ctx.channel.id, message.author.id)
+
+        if message.author.bot and context.settings.bot2bot is False:
+            self.rejections["bot2bot"] += 1
             return
-        if await self.__check_ban_or_whitelist__(ctx, message.author):
+        if context.blocked:
+            self.rejections["blocked"] += 1
             return
         
         message_content = message.content
-        print(message.attachments)
-        image_url = await self.__get_any_image__(ctx, message)
-
-        if message.reference and message.reference.message_id: 
-            referenced_message = await message.channel.fetch_message(message.reference.message_id)
+        referenced_message = await self.__resolve_reference__(message)
+        image_url = await self.__get_any_image__(ctx, message, referenced_message)
 
+        if referenced_message is not None:
             # Suggested by https://github.com/R2Boyo25
             message_content = "\"" + referenced_message.content + "\"\n" + message_content
             # message_content = "> " + referenced_message.content.strip().replace("\n", "\n> ")
 
             if (referenced_message.author == self.bot.user) or (self.bot.user in message.mentions):
-                await self.__llm_chat__(ctx, message_content, image_url)
+                self.message_counts["accepted"] += 1
+                await self.__llm_chat__(ctx, context, message_content, image_url)
+            else:
+                self.rejections["not_addressed"] += 1
 
         elif self.bot.user in message.mentions:
-            if await self.__check_ban_or_whitelist__(ctx, message.author):
-                return
-            
-            await self.__llm_chat__(ctx, message_content, image_url)
+            self.message_counts["accepted"] += 1
+            await self.__llm_chat__(ctx, context, message_content, image_url)
 
 
-    async def __image_to_base64__(self, url):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    return base64.b64encode(await response.read()).decode("utf-8")
-                
-        return None
-    
-
-    async def __image_to_pil__(self, url):
+    async def __download_image__(self, url):
+        """
+        Download an image without ever holding more than the configured maximum size in memory.
+        """
+        max_bytes = self.bot.max_image_bytes
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        return Image.open(io.BytesIO(await response.read()))
-        except:
+            async with self.bot.aiohttp_session.get(url) as response:
+                if response.status != 200:
+                    return None
+                # aiohttp reports a missing content type as application/octet-stream
+                if not response.content_type.startswith("image/") and response.content_type != "application/octet-stream":
+                    return None
+                if response.content_length and response.content_length > max_bytes:
+                    return None
+
+                data = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    data += chunk
+                    if len(data) > max_bytes:
+                        return None
+                return data
+        except Exception:
             return None
-                
-        return None
     
 
-    async def __process_pil__(self, image):
-        if image.format == "GIF":
-            if hasattr(image, 'is_animated') and image.is_animated:
-                frame_index = 0
-                if hasattr(image, 'n_frames') and image.n_frames > 1:
-                    frame_index = image.n_frames // 2
-                image.seek(frame_index)
-            image = image.convert("RGBA")
-        
-        image.thumbnail((672, 672), Image.Resampling.LANCZOS)
-        
-        # Convert image to a byte stream
-        with io.BytesIO() as img_byte_arr:
-            image.save(img_byte_arr, format="PNG")
-            img_byte_arr.seek(0)
-            img_base64 = base64.b64encode(img_byte_arr.read()).decode('utf-8')
-        
-        return img_base64
+    async def __process_image__(self, data: bytes):
+        """
+        Shrink and encode an image in the worker pool, returns the base64 encoded PNG.
+        """
+        return await self.ll.run_in_executor(self.pp, process_image, data, 672, self.bot.max_image_pixels)
+
+
+    @staticmethod
+    def __image_key__(url: str) -> str:
+        """
+        Identify an image by its URL. Discord attachment links carry expiring signature parameters
+        and are served from both cdn.discordapp.com and media.discordapp.net, so only the path counts.
+        """
+        parsed = urlparse(url)
+        if parsed.hostname in ("cdn.discordapp.com", "media.discordapp.net") and parsed.path.startswith("/attachments/"):
+            return f"attachment:{parsed.path}"
+        return url
+
+
+    async def __fetch_image__(self, url):
+        """
+        Download and process an image, returns its content hash and the encoded image.
+        Already processed images are served from memory.
+        """
+        key = self.__image_key__(url)
+        digest = self.image_ids.get(key)
+        if digest:
+            img = self.image_cache.get(digest)
+            if img:
+                return digest, img
 
+        # several people replying to the same image at once only download and process it once
+        return await self.flights.do(("image", key), lambda: self.__load_image__(url, key))
 
-    async def __get_image_context__(self, img = None, prompt: str = None, model: str = None) -> str:
+
+    async def __load_image__(self, url, key):
+        with self.timings.stage("image_download"):
+            data = await self.__download_image__(url)
+        if not data:
+            return None
+
+        # hashlib releases the GIL on large inputs, so hashing in a thread keeps the loop responsive
+        digest = (await asyncio.to_thread(hashlib.sha256, data)).hexdigest()
+        self.image_ids.put(key, digest)
+
+        img = self.image_cache.get(digest)
+        if not img:
+            with self.timings.stage("image_process"):
+                img = await self.__process_image__(data)
+            if not img:
+                return None
+            self.image_cache.put(digest, img)
+
+        return digest, img
+
+
+    async def __get_image_context__(self, img: str = None, prompt: str = None, model: str = None, digest: str = None, guild_id: int = 0, user_id: int = 0) -> str:
         """
-        Get the image context from the vision model.
+        Get the image context from the vision model. Descriptions are cached by image content,
+        model and prompt so the same image is only described once.
         """
         if not img:
             return None
@@ -911,8 +1130,40 @@ class ChatCommands(commands.Cog):
         if not prompt:
             prompt = self.default_vision_prompt
 
-        image_base64 = []
-        image_base64.append(await self.__process_pil__(img))
+        cache_key = None
+        if digest:
+            prompt_digest = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+            cache_key = f"vision:{model}:{prompt_digest}:{digest}"
+
+            description = self.vision_cache.get(cache_key)
+            if description is None:
+                description = await self.redis.get(cache_key)
+                if description is not None:
+                    self.vision_cache.put(cache_key, description)
+            if description is not None:
+                return description
+
+        if cache_key:
+            # several people replying to the same image at once only cause one description
+            return await self.flights.do(cache_key, lambda: self.__describe_image__(img, prompt, model, guild_id, user_id, cache_key))
+
+        return await self.__describe_image__(img, prompt, model, guild_id, user_id)
+
+
+    async def __describe_image__(self, img: str, prompt: str, model: str, guild_id: int = 0, user_id: int = 0, cache_key: str = None) -> str:
+        async with self.scheduler.slot(guild_id, user_id):
+            with self.timings.stage("vision"):
+                description = await self.__run_vision_model__(img, prompt, model, guild_id)
+
+        if cache_key and description:
+            self.vision_cache.put(cache_key, description)
+            await self.redis.set(cache_key, description, ex=self.bot.vision_cache_ttl)
+
+        return description
+
+
+    async def __run_vision_model__(self, img: str, prompt: str, model: str, guild_id: int = None) -> str:
+        image_base64 = [img]
 
         chat = [
             {
@@ -924,73 +1175,67 @@ class ChatCommands(commands.Cog):
         if image_base64:
             chat[-1]["images"] = image_base64
 
-        response = await self.ollama.chat(model=model, messages=chat, stream=False)
+        self.residency.touch(model)
+        response = await self.ollama.chat(model=model, messages=chat, stream=False, keep_alive=self.residency.keep_alive(model))
+        # descriptions are shared between channels, so they only count for the model
+        self.telemetry.record(model, response, guild_id)
 
         if hasattr(response, "message") and hasattr(response.message, "content"):
-            assistant_reply = response.message.content
             # remove the stuff inside the <think> tag for reasoning models
-            assistant_reply = assistant_reply.split("</think>")[-1]
-
-            return assistant_reply
+            return strip_reasoning(response.message.content)
 
         else:
             return None
 
 
 
-    async def __llm_chat__(self, ctx: discord.ApplicationContext, message: str, image_url: str = None):
+    async def __llm_chat__(self, ctx: discord.ApplicationContext, context: ConversationContext, message: str, image_url: str = None):
         """
         Chat with the selected model using an image.
         """
-        redis_key_settings = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:settings"
-        redis_key_history = f"guild:{ctx.guild.id}:channel:{ctx.channel.id}:user:{ctx.author.id}:history"
-        model = await self.redis.hget(redis_key_settings, "model")
-        is_vision = await self.redis.hget(redis_key_settings, "vision")
+        settings = context.settings
+        model = settings.model
+        is_vision = settings.vision
         vision_model = None
         vision_prompt = None
 
-        if is_vision == "False":
-            vision_model = await self.redis.hget(redis_key_settings, "vision_fallback")
-            if not vision_model:
-                vision_model = None
-            else:
-                vision_prompt = await self.redis.hget(redis_key_settings, "vision_prompt")
+        if is_vision is False:
+            vision_model = settings.vision_fallback
+            if vision_model:
+                vision_prompt = settings.vision_prompt
                 if not vision_prompt:
                     vision_prompt = self.default_vision_prompt
 
         if not model:
             return await ctx.respond("No model selected for this channel.")
         
-        prompt = await self.redis.hget(redis_key_settings, "prompt")
+        prompt = settings.prompt
 
         if not prompt:
             prompt = self.default_prompt
-            await self.redis.hset(redis_key_settings, "prompt", prompt)
+            await self.settings.set(ctx.guild.id, ctx.channel.id, prompt=prompt)
 
         
 
 
         try:
             async with ctx.typing():
-                # Get chat history from redis
-                chat_history = await self.redis.hget(redis_key_history, "chat_history")
-
-                if chat_history:
-                    chat_history = json.loads(chat_history)
-                else:
-                    chat_history = None
+                # chat history was already loaded together with the rest of the context
+                conversation = context.conversation
+                chat_history = conversation.to_chat(prompt)
 
                 # Fetch image from URL and save to file, if provided
                 image_base64 = []
                 image_context = None
                 if image_url:
-                    img = await self.__image_to_pil__(image_url)
-                    if img:
-                        if is_vision == "False":
-                            image_context = await self.__get_image_context__(img, vision_prompt, vision_model)
+                    image = await self.__fetch_image__(image_url)
+                    if image:
+                        digest, img = image
+                        if is_vision is False:
+                            image_context = await self.__get_image_context__(img, vision_prompt, vision_model, digest, ctx.guild.id, ctx.author.id)
                             image_base64 = None
                         else:
-                            image_base64.append(await self.__process_pil__(img))
+                            image_base64.append(img)
                     else:
                       image_base64 = None
                 else:
@@ -1000,116 +1245,90 @@ class ChatCommands(commands.Cog):
                     # insert the image context at the start of the message
                     message = f"Image context: {image_context}\n User message: {message}"
 
-                if chat_history is None:
-                    chat_history = [
-                        {
-                            "role": "system",
-                            "content": prompt,
-                        },
-                        {
-                            "role": "user",
-                            "content": message,
-                        },
-                    ]
-                else:
-                    chat_history.append(
-                        {
-                            "role": "user",
-                            "content": message,
-                        }
-                    )
+                user_message = {
+                    "role": "user",
+                    "content": message,
+                }
 
                 if image_base64:
-                    chat_history[-1]["images"] = image_base64
-
-                response = await self.ollama.chat(model=model, messages=chat_history, stream=False)
-
-                # Extract response message from assistant
-                if hasattr(response, "message") and hasattr(response.message, "content"):
-                    assistant_reply = response.message.content
-
-                    # remove the stuit ff inside the <think> tag for reasoning models
-                    assistant_reply = assistant_reply.split("</think>")[-1]
-
-                    # Add response to chat history
-                    chat_history.append(
-                        {
-                            "role": "assistant",
-                            "content": assistant_reply,
-                        }
-                    )
-
-                    # remove any mention of 265651045911232512
-                    assistant_reply = assistant_reply.replace("<@265651045911232512>", "[REDACTED]").replace("<@!265651045911232512>", "[REDACTED]").replace("@dragon_enjoyer", "[REDACTED]").replace("@Derg", "[REDACTED]")
-                    
-                    # divide the response into 2 000 character blocks
-                    assistant_reply = [assistant_reply[i:i + 2000] for i in range(0, len(assistant_reply), 2000)]
-
-                    # Clear the oldest entry if chat history is longer than 10 entries
-                    if len(chat_history) > self.max_history:
-                        chat_history.pop(1)
-                        chat_history.pop(1)
+                    user_message["images"] = image_base64
+
+                chat_history.append(user_message)
+
+                # drop the oldest messages that don't fit in the context window, leaving room for the reply
+                num_ctx = self.__context_length__(model)
+                fitted = fit_to_budget(chat_history, num_ctx - min(self.bot.reply_token_reserve, num_ctx // 4))
+                # they won't fit on the following turns either, so they are dropped from the history too
+                dropped = len(chat_history) - len(fitted)
+                chat_history = fitted
+                prompt_tokens = sum(message_tokens(message) for message in chat_history)
+                keep_alive = self.residency.keep_alive(model)
+                self.residency.touch(model)
+
+                reply = StreamedReply(ctx, edit_interval=self.bot.stream_edit_interval, redacted=REDACTED_MENTIONS, timings=self.timings,
+                                      pacer=self.pacer, spill_threshold=self.bot.attachment_threshold)
+
+                async with self.scheduler.slot(ctx.guild.id, ctx.author.id):
+                    # only the time spent waiting for ollama counts as inference, sending is timed by the reply
+                    start = time.perf_counter()
+                    if self.bot.stream_replies:
+                        # show the reply while it is being generated
+                        response = None
+                        inference = 0.0
+                        resumed = start
+                        async for part in await self.ollama.chat(model=model, messages=chat_history, stream=True, keep_alive=keep_alive):
+                            received = time.perf_counter()
+                            inference += received - resumed
+                            if response is None:
+                                self.timings.observe("first_token", received - start)
+                            # the last part carries the timings
+                            response = part
+                            if hasattr(part, "message") and hasattr(part.message, "content"):
+                                await reply.feed(part.message.content)
+                            resumed = time.perf_counter()
+                        self.timings.observe("inference", inference + time.perf_counter() - resumed)
+                        replied = await reply.finish()
+                    else:
+                        response = await self.ollama.chat(model=model, messages=chat_history, stream=False, keep_alive=keep_alive)
+                        self.timings.observe("inference", time.perf_counter() - start)
+                        replied = False
+                        if hasattr(response, "message") and hasattr(response.message, "content"):
+                            replied = await reply.finish(response.message.content)
+                    self.telemetry.record(model, response, ctx.guild.id, ctx.channel.id, prompt_tokens)
+
+                if replied:
+                    # only this turn is written, the history store trims the oldest messages
+                    assistant_message = {
+                        "role": "assistant",
+                        "content": reply.reply,
+                    }
+                    with self.timings.stage("history_write"):
+                        length = await self.history.append(ctx.guild.id, ctx.channel.id, ctx.author.id, conversation, prompt, [user_message, assistant_message], dropped)
+                    self.compactor.maybe_compact(ctx.guild.id, ctx.channel.id, ctx.author.id, length)
                 else:
                     await ctx.respond("Sorry, I couldn't generate a response.")
 
-                    # Remove the last user message if the assistant failed to respond
-                    chat_history.pop(-1)
-
-                # Save chat history to redis
-                await self.redis.hset(redis_key_history, "chat_history", json.dumps(chat_history))
-
-                for reply in assistant_reply:
-                    await ctx.respond(reply)
-
         except Exception as e:
             await ctx.respond(f"Error occurred: {e}")
 
 
-    async def __load_models_async__(self):
-        """Asynchronously fetch model list after cog initialization"""
-        try:
-            response = await self.ollama.list()  # Await the async call properly
-            
-            # Ensure response has the models attribute
-            if not hasattr(response, "models"):
-                raise ValueError("Unexpected response format from self.ollama.list()")
-
-            self.models = [
-                {
-                    "model": model.model,
-                    "modified_at": model.modified_at,  # This is already a datetime object
-                    "digest": model.digest,
-                    "size_mb": round(model.size / 1024 / 1024, 2),  # Convert bytes to MB
-                    "details": {
-                        "format": model.details.format if model.details else None,
-                        "family": model.details.family if model.details else None,
-                        "parameter_size": model.details.parameter_size if model.details else None,
-                        "quantization_level": model.details.quantization_level if model.details else None,
-                    }
-                }
-                for model in response.models  # Iterate through models list
-            ]
-            self.last_updated = datetime.now()
-
-        except Exception as e:
-            print(f"Failed to load models: {e}")
-    
-
-    def __format_model_list__(self, models: List[Dict]):
+    def __format_model_list__(self, models: ModelRegistry):
         embed = discord.Embed(
             title="Model List",
             description="List of available models",
             color=discord.Color.blurple(),
-            timestamp=self.last_updated
+            timestamp=models.last_updated
         )
 
         for model in models:
             embed.add_field(
-                name=model["model"],
-                value=f"Size: {model['size_mb']} MB\n"
-                      f"Family: {model['details']['family']}\n"
-                      f"Params: {model['details']['parameter_size']}\n"
-                      f"Quantization: {model['details']['quantization_level']}",
+                name=model.name,
+                value=f"Size: {model.size_mb} MB\n"
+                      f"Family: {model.family}\n"
+                      f"Params: {model.parameter_size}\n"
+                      f"Quantization: {model.quantization_level}\n"
+                      f"Vision: {'Yes' if model.vision else 'No'}\n"
+                      f"Context: {model.context_length or 'Unknown'}",
                 inline=False
             )
         
@@ -1117,7 +1336,11 @@ class ChatCommands(commands.Cog):
 
 
     def cog_unload(self):
-        pass
+        self.bus.stop()
+        self.residency.stop()
+        self.models.stop()
+        self.compactor.stop()
+        self.pp.shutdown(wait=False, cancel_futures=True)
 
 
 def setup(bot):
@@ -13,6 +13,31 @@ class ListenerCog(commands.Cog):
     def __init__(self, bot):
         self.dirname = bot.dirname
         self.bot: discord.Client = bot
+        self.reset_hourly_invokes.start()
+
+
+    def cog_unload(self):
+        self.reset_hourly_invokes.cancel()
+
+
+    @tasks.loop(hours=1)
+    async def reset_hourly_invokes(self):
+        self.bot.command_invokes_hour = 0
+
+
+    def __count_invoke__(self):
+        self.bot.command_invokes_hour += 1
+        self.bot.command_invokes_total += 1
+
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx: commands.Context):
+        self.__count_invoke__()
+
+
+    @commands.Cog.listener()
+    async def on_application_command(self, ctx: discord.ApplicationContext):
+        self.__count_invoke__()
 
 
     @commands.Cog.listener()
@@ -0,0 +1,114 @@
+#  Copyright (c) 2025 diminDDL, Cuprum77
+#  License: MIT License
+
+import discord
+from discord.ext import commands
+
+from ollamads.base.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+class MetricsCog(commands.Cog):
+    """
+    Exports metrics in the Prometheus text format on http://<metrics host>:<metrics port>/metrics.
+    Nothing is measured or served while the metrics port is not set.
+    """
+    def __init__(self, bot):
+        self.bot: discord.Client = bot
+        self.registry = MetricsRegistry()
+
+        if not self.bot.metrics_port:
+            return
+
+        chat = self.bot.get_cog("ChatCommands")
+        if chat is not None:
+            self.__register_chat__(chat)
+
+        self.registry.register(Counter(
+            "ollamads_command_invokes_total", "Commands run since the bot started.",
+            collect=lambda: {(): self.bot.command_invokes_total},
+        ))
+
+        self.bot.loop.create_task(self.__start__())
+
+
+    def __register_chat__(self, chat):
+        registry = self.registry
+
+        stages = registry.register(Histogram(
+            "ollamads_stage_seconds", "Time spent in each stage of answering a message.", ["stage"],
+        ))
+        chat.timings.subscribe(lambda stage, seconds: stages.observe(seconds, stage))
+
+        registry.register(Counter(
+            "ollamads_messages_seen_total", "Messages the bot received.",
+            collect=lambda: {(): chat.message_counts["seen"]},
+        ))
+        registry.register(Counter(
+            "ollamads_messages_accepted_total", "Messages the bot answered.",
+            collect=lambda: {(): chat.message_counts["accepted"]},
+        ))
+        registry.register(Counter(
+            "ollamads_messages_rejected_total", "Messages the bot did not answer, by reason.", ["reason"],
+            collect=lambda: {(reason,): count for reason, count in chat.rejections.items()},
+        ))
+
+        registry.register(Gauge(
+            "ollamads_messages_in_flight", "Messages being answered right now.",
+            collect=lambda: {(): chat.in_flight},
+        ))
+        registry.register(Gauge(
+            "ollamads_inference_running", "Ollama requests running right now.",
+            collect=lambda: {(): chat.scheduler.running},
+        ))
+        registry.register(Gauge(
+            "ollamads_inference_queued", "Ollama requests waiting for a slot.",
+            collect=lambda: {(): chat.scheduler.queued},
+        ))
+
+        caches = {
+            "vision": chat.vision_cache,
+            "image": chat.image_cache,
+            "image_url": chat.image_ids,
+            "referenced_message": chat.referenced,
+        }
+        registry.register(Counter(
+            "ollamads_cache_hits_total", "Cache hits.", ["cache"],
+            collect=lambda: {(name,): cache.hits for name, cache in caches.items()},
+        ))
+        registry.register(Counter(
+            "ollamads_cache_misses_total", "Cache misses.", ["cache"],
+            collect=lambda: {(name,): cache.misses for name, cache in caches.items()},
+        ))
+        registry.register(Gauge(
+            "ollamads_cache_hit_ratio", "Share of cache lookups that were hits since the bot started.", ["cache"],
+            collect=lambda: {(name,): cache.hits / (cache.hits + cache.misses) for name, cache in caches.items() if cache.hits + cache.misses},
+        ))
+        registry.register(Gauge(
+            "ollamads_cache_entries", "Entries in each cache.", ["cache"],
+            collect=lambda: {(name,): len(cache) for name, cache in caches.items()},
+        ))
+
+        registry.register(Gauge(
+            "ollamads_ollama_up", "Whether an ollama server passed its last health check.", ["host"],
+            collect=lambda: {(backend.host,): int(backend.healthy) for backend in chat.ollama.backends},
+        ))
+        registry.register(Gauge(
+            "ollamads_ollama_outstanding", "Requests sent to an ollama server that did not finish yet.", ["host"],
+            collect=lambda: {(backend.host,): backend.outstanding for backend in chat.ollama.backends},
+        ))
+
+
+    async def __start__(self):
+        try:
+            await self.registry.start(self.bot.metrics_host, self.bot.metrics_port)
+            print(f"Serving metrics on {self.bot.metrics_host}:{self.bot.metrics_port}/metrics")
+        except OSError as e:
+            print(f"Failed to start the metrics endpoint: {e}")
+
+
+    def cog_unload(self):
+        self.bot.loop.create_task(self.registry.stop())
+
+
+def setup(bot):
+    bot.add_cog(MetricsCog(bot))
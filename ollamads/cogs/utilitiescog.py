@@ -69,8 +69,18 @@ class UtilityCommands(commands.Cog, name="utility commands"):
                         value=f"""Guilds: **{guilds}**
                                 Extensions Loaded: **{len(self.bot.extensions)}**
                                 Total users: **{total_users}**
+                                Commands run: **{self.bot.command_invokes_hour}** this hour, **{self.bot.command_invokes_total}** in total
                                 Bot version: **{self.bot.version}**
                                 """, inline=False)
+
+        chat = self.bot.get_cog("ChatCommands")
+        if chat is not None:
+            models = chat.telemetry.busiest_models()
+            if models:
+                embed.add_field(name="Inference (last hour)",
+                                value="\n".join(f"**{model}**: {summary}" for model, summary in models),
+                                inline=False)
+
         try:
             embed.set_thumbnail(url=str(self.bot.user.avatar.url))
         except: